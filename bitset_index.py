@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+絞り込み用ビットセット索引。
+行（砦）ごとの値から「値ごとに該当行のビットを立てた集合」をビルド時に作り、ページ側は語単位の AND/OR で表示集合を得る。
+ビット i は i 行目。リトルエンディアンの 32bit 語列を base64 にして埋め込み、BITSET_JS で Uint32Array に戻す。
+"""
+import base64
+
+
+def build_bitsets(facets: dict, n: int) -> dict:
+    """facets: {絞り込み名: 行ごとの値の列}。→ {"n": 行数, "sets": {絞り込み名: {値: base64}}}。"""
+    nbytes = (n + 31) // 32 * 4
+    sets = {}
+    for facet, values in facets.items():
+        by_value = {}
+        for i, v in enumerate(values):
+            bits = by_value.get(v)
+            if bits is None:
+                bits = by_value[v] = bytearray(nbytes)
+            bits[i >> 3] |= 1 << (i & 7)
+        sets[facet] = {str(v): base64.b64encode(bits).decode("ascii") for v, bits in by_value.items()}
+    return {"n": n, "sets": sets}
+
+
+# ページ側の復元・集合演算。各ページの <script> 内にそのまま埋め込む（ES5）
+BITSET_JS = r"""
+  var Bits = {
+    words: function(n) { return new Uint32Array((n + 31) >>> 5); },
+    decode: function(b64, n) {
+      var out = Bits.words(n), bin = atob(b64 || ''), u8 = new Uint8Array(out.buffer);
+      for (var i = 0; i < bin.length && i < u8.length; i++) u8[i] = bin.charCodeAt(i);
+      return out;
+    },
+    all: function(n) {
+      var out = Bits.words(n);
+      out.fill(0xffffffff);
+      if (n & 31) out[out.length - 1] = (1 << (n & 31)) - 1;
+      return out;
+    },
+    and: function(dst, src) { for (var w = 0; w < dst.length; w++) dst[w] &= src[w]; return dst; },
+    or: function(dst, src) { for (var w = 0; w < dst.length; w++) dst[w] |= src[w]; return dst; },
+    andNot: function(dst, src) { for (var w = 0; w < dst.length; w++) dst[w] &= ~src[w]; return dst; },
+    has: function(bits, i) { return (bits[i >>> 5] >>> (i & 31)) & 1; },
+    count: function(bits) {
+      var c = 0;
+      for (var w = 0; w < bits.length; w++) {
+        var v = bits[w] - ((bits[w] >>> 1) & 0x55555555);
+        v = (v & 0x33333333) + ((v >>> 2) & 0x33333333);
+        c += (((v + (v >>> 4)) & 0x0f0f0f0f) * 0x01010101) >>> 24;
+      }
+      return c;
+    },
+    forEach: function(bits, fn) {
+      for (var w = 0; w < bits.length; w++) {
+        var v = bits[w];
+        while (v) {
+          var t = v & -v;
+          fn((w << 5) + 31 - Math.clz32(t));
+          v ^= t;
+        }
+      }
+    },
+    /* a と b で立ち方の違う行だけを fn(i, b に含まれるか) で返す（表示の差分更新用） */
+    forEachChanged: function(a, b, fn) {
+      for (var w = 0; w < a.length; w++) {
+        var d = a[w] ^ b[w];
+        while (d) {
+          var t = d & -d, i = (w << 5) + 31 - Math.clz32(t);
+          fn(i, (b[w] & t) !== 0);
+          d ^= t;
+        }
+      }
+    }
+  };
+"""
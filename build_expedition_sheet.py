@@ -6,8 +6,24 @@
 
 import re
 import csv
+import heapq
+import json
+import mmap
+import os
+import pickle
+import shutil
+import tempfile
+from array import array
+from functools import lru_cache, partial
+from itertools import accumulate, chain, islice
+from operator import itemgetter, methodcaller
 from pathlib import Path
 
+from bitset_index import BITSET_JS, build_bitsets
+from build_jobs import BuildError, run_jobs, shared_pool
+from expedition_core import get_region, list_of_kind, load_regions, star_level
+from service_worker import SW_REGISTER_JS, write_service_worker
+
 BASE_DIR = Path(__file__).parent
 # w 用（em6）
 MAP_BASE = "https://w1.3gokushi.jp/map.php"
@@ -15,42 +31,142 @@ AUTO_BASE = "https://w1.3gokushi.jp/auto_send_troop/index.php"
 # E側用（cw2）砦攻略システムと合わせて c4
 MAP_BASE_CW = "https://c4.3gokushi.jp/map.php"
 AUTO_BASE_CW = "https://c4.3gokushi.jp/auto_send_troop/index.php"
+REGION_ORDER = ["北西", "北", "北東", "西", "中原", "東", "南西", "南", "南東"]
+# これを超える行数は整列済みチャンクをディスクに書き出し、外部マージソートで並べる
+SORT_MEMORY_ROWS = 2_000_000
+_COORD_OFFSET = 1 << 15  # 並べ替えキーに詰める座標の下駄（座標は ±32767 まで）
+_SPILL_BATCH = 10_000  # チャンクファイルを読み書きする単位（マージ中はチャンク数×これだけ持つ）
+_END = object()
+LIST_PAGE_ROWS = 800  # 一覧HTMLに載せる先頭の行数（全件はCSV）
 
 
-def load_regions(path: Path) -> list:
-    """座標区分けリスト.txt を読み、地域の矩形リストを返す。"""
-    regions = []
-    for line in path.read_text(encoding="utf-8").strip().splitlines():
-        m = re.match(r"(.+?)\((-?\d+),(-?\d+)\)\((-?\d+),(-?\d+)\)", line.strip())
-        if not m:
-            continue
-        name, x1, y1, x2, y2 = m.group(1), int(m.group(2)), int(m.group(3)), int(m.group(4)), int(m.group(5))
-        x_min, x_max = min(x1, x2), max(x1, x2)
-        y_min, y_max = min(y1, y2), max(y1, y2)
-        regions.append((name.strip(), x_min, x_max, y_min, y_max))
-    return regions
+def region_sort_key(name: str) -> tuple:
+    try:
+        return (REGION_ORDER.index(name),)
+    except ValueError:
+        return (99, name)
 
 
-def get_region(x: int, y: int, regions: list) -> str:
-    for name, x_min, x_max, y_min, y_max in regions:
-        if x_min <= x <= x_max and y_min <= y <= y_max:
-            return name
-    return ""
+def region_ranks(regions: list) -> dict:
+    """地域名（未区分の "" を含む）→ region_sort_key の順に振った整数。"""
+    names = sorted({r[0] for r in regions} | set(REGION_ORDER) | {""}, key=region_sort_key)
+    return {name: i for i, name in enumerate(names)}
 
 
-def region_sort_key(name: str) -> tuple:
-    order = ["北西", "北", "北東", "西", "中原", "東", "南西", "南", "南東"]
+def pack_sort_key(rank: int, x: int, y: int) -> int:
+    """(地域順, -Y, X) を1つの整数に詰める。大小関係はタプルのときと同じ。
+
+    座標は下駄を履かせて16bitずつ詰めるので、収まらない座標は隣の欄を壊さないよう ValueError にする。
+    """
+    ux, uy = x + _COORD_OFFSET, _COORD_OFFSET - y
+    if not (0 <= ux <= 0xFFFF and 0 <= uy <= 0xFFFF):
+        raise ValueError(f"座標が並べ替えキーの範囲（±32767）を超えています: ({x}, {y})")
+    return (rank << 32) | (uy << 16) | ux
+
+
+class SortedRows:
+    """並べ替え済みの行。メモリ上のリストか、ディスク上の整列済みチャンク群を持つ。
+
+    何度でも先頭から反復でき、反復ごとに独立して読むので並列の書き出しジョブ（別プロセス）から同時に使える。
+    チャンク群のときは反復のたびに heapq.merge で併合しながら流す（別プロセスへはチャンクのパスだけが渡る）。
+    """
+
+    def __init__(self, rows=None, chunk_paths=(), count=0, tmp_dir=None):
+        self._rows = rows
+        self._chunk_paths = list(chunk_paths)
+        self._count = len(rows) if rows is not None else count
+        self._tmp_dir = tmp_dir
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def on_disk(self) -> bool:
+        return self._rows is None
+
+    def __getstate__(self):
+        # 書き出しジョブの別プロセスへ渡すコピーは一時ディレクトリを持たない（後始末は元のプロセスの close() だけ）
+        return dict(self.__dict__, _tmp_dir=None)
+
+    def __iter__(self):
+        if self._rows is not None:
+            return iter(self._rows)
+        merged = heapq.merge(*(_read_chunk(p) for p in self._chunk_paths), key=itemgetter(0))
+        return (row for _, row in merged)
+
+    def close(self) -> None:
+        if self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._tmp_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _sort_chunk(chunk: list, ranks: dict) -> tuple:
+    """chunk を詰めたキーで並べ、(キー配列, 並べた行) を返す（同じキーは入力順のまま）。"""
+    keys = array("q", [pack_sort_key(ranks[r[0]], r[1], r[2]) for r in chunk])
+    order = sorted(range(len(chunk)), key=keys.__getitem__)
+    return [keys[i] for i in order], [chunk[i] for i in order]
+
+
+def _write_chunk(path: Path, keys: list, rows: list) -> None:
+    with open(path, "wb") as f:
+        for i in range(0, len(rows), _SPILL_BATCH):
+            pickle.dump(list(zip(keys[i:i + _SPILL_BATCH], rows[i:i + _SPILL_BATCH])), f, pickle.HIGHEST_PROTOCOL)
+
+
+def _read_chunk(path: Path):
+    with open(path, "rb") as f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+
+def sort_rows(records, regions: list, max_rows_in_memory: int = SORT_MEMORY_ROWS) -> SortedRows:
+    """行 (地域, x, y, …) を 地域順→Y降順→X昇順 に並べる。
+
+    入力は反復可能なら何でもよく、max_rows_in_memory 行ずつ読む。1チャンクに収まればメモリ上で、
+    収まらなければ各チャンクを並べて一時ディレクトリに書き、SortedRows が併合しながら流す。
+    メモリに持つのは常に1チャンク（＋先読みの1行）だけ。
+    """
+    ranks = region_ranks(regions)
+    it = iter(records)
+    keys, rows = _sort_chunk(list(islice(it, max_rows_in_memory)), ranks)
+    # 続きがあるか（ディスクに書き出すか）は1行だけ先読みして決め、読んだ行は戻す
+    head = next(it, _END)
+    if head is _END:
+        return SortedRows(rows)
+    it = chain((head,), it)
+    tmp_dir = Path(tempfile.mkdtemp(prefix="expedition_sort_"))
     try:
-        return (order.index(name),)
-    except ValueError:
-        return (99, name)
+        paths, count = [], 0
+        while rows:
+            path = tmp_dir / f"chunk{len(paths):05d}.pickle"
+            _write_chunk(path, keys, rows)
+            paths.append(path)
+            count += len(rows)
+            # 書き出したチャンクを手放してから次を読む
+            keys = rows = None
+            keys, rows = _sort_chunk(list(islice(it, max_rows_in_memory)), ranks)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return SortedRows(chunk_paths=paths, count=count, tmp_dir=tmp_dir)
 
 
 def load_tsv_forts(path: Path, kind: str) -> list:
     """砦リストTSVを読み、(x, y, 名称, ★, 種別) のリストを返す。"""
     rows = []
     text = path.read_text(encoding="utf-8")
-    lines = text.strip().splitlines()
+    # 末尾は削らない（最終行の★が空のとき、その行ごと落ちてしまうため）
+    lines = text.lstrip().splitlines()
     if not lines:
         return rows
     # ヘッダー: NPC名	X座標	Y座標	★
@@ -67,63 +183,166 @@ def load_tsv_forts(path: Path, kind: str) -> list:
     return rows
 
 
-def main():
-    regions_path = BASE_DIR / "座標区分けリスト.txt"
-    cw2_path = BASE_DIR / "cw2.txt"
-    em6_path = BASE_DIR / "em6DATA.txt"
-
-    regions = load_regions(regions_path)
-    cw2_rows = load_tsv_forts(cw2_path, "砦(cw2)")
-    em6_rows = load_tsv_forts(em6_path, "砦(em6)")
-
-    # 統合: (地域, x, y, 種別, 名称, ★, …)。w=w1, E側=c4（砦攻略システムと合わせる）
-    def to_record(x, y, kind, name, star):
-        region = get_region(x, y, regions)
-        if "cw2" in kind:
-            map_url = f"{MAP_BASE_CW}?x={x}&y={y}"
-            auto_url = f"{AUTO_BASE_CW}?x={x}&y={y}"
-        else:
-            map_url = f"{MAP_BASE}?x={x}&y={y}"
-            auto_url = f"{AUTO_BASE}?x={x}&y={y}"
-        return (region, x, y, kind, name, star, map_url, auto_url)
-
-    all_rows = []
-    for (x, y, name, star, kind) in cw2_rows:
-        all_rows.append(to_record(x, y, kind, name, star))
-    for (x, y, name, star, kind) in em6_rows:
-        all_rows.append(to_record(x, y, kind, name, star))
-
-    # 並び: 地域順（北西→南東）、同一地域内は Y 降順・X 昇順（北から南、西から東）
-    def row_key(r):
-        region, x, y = r[0], r[1], r[2]
-        return (region_sort_key(region), -y, x)
-
-    all_rows.sort(key=row_key)
-
-    # CSV 出力
-    out_csv = BASE_DIR / "遠征計画_座標別一覧.csv"
-    with open(out_csv, "w", encoding="utf-8-sig", newline="") as f:
-        w = csv.writer(f)
-        w.writerow(["地域", "X", "Y", "種別", "名称", "★", "MAP", "自動出兵SC", "備考"])
-        for r in all_rows:
-            w.writerow([r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[7], ""])
-
+# 1行 = 名称 \t X \t Y \t ★（5列目以降は無視）。列数が揃わないブロックの読み直し用
+_TSV_FORT_RE = re.compile(rb"^[^\t\r\n]*\t *(-?\d+) *\t *(-?\d+) *\t", re.M)
+_LEADING_SPACE_RE = re.compile(rb"\s*")
+_count_tabs = methodcaller("count", b"\t")
+_PARSE_BLOCK = 1 << 23  # 一度に分割するバイト数（行境界で切る）。分割中の一時オブジェクトをこの大きさに抑える
+
+
+class FortTable:
+    """砦リストTSVを mmap したまま列ごとの配列に持つ表。
+
+    X・Y は array('i')、行はマップ上の開始位置（array('q')）だけを持ち、
+    名称と★表記は name() / star() で要求されたときに初めてその行を切り出してデコードする。
+    反復すると load_tsv_forts と同じ (x, y, 名称, ★, 種別) を返す。
+    """
+
+    def __init__(self, buf, kind: str):
+        self.kind = kind
+        self._buf = buf
+        self.x = array("i")
+        self.y = array("i")
+        self._line_start = array("q")
+        if buf is None:
+            return
+        # 先頭の空白を飛ばし、ヘッダー行（NPC名	X座標	Y座標	★）の次から読む
+        pos = buf.find(b"\n", _LEADING_SPACE_RE.match(buf).end()) + 1 or len(buf)
+        while pos < len(buf):
+            end = buf.find(b"\n", min(pos + _PARSE_BLOCK, len(buf)) - 1) + 1 or len(buf)
+            if not self._scan_block(pos, end):
+                self._scan_block_re(pos, end)
+            pos = end
+
+    def _scan_block(self, pos: int, end: int) -> bool:
+        """ブロック内が全行ちょうど4列なら、タブ・改行でまとめて分割して X・Y を一括変換する。"""
+        block = self._buf[pos:end]
+        if block.endswith(b"\n"):
+            block = block[:-1]
+        lines = block.split(b"\n")
+        # 合計の列数だけでは 5列の行と3列の行が打ち消し合うので、行ごとにタブが3つか確かめる
+        if any(map((3).__ne__, map(_count_tabs, lines))):
+            return False
+        fields = block.replace(b"\n", b"\t").split(b"\t")
+        try:
+            xs = array("i", map(int, fields[1::4]))
+            ys = array("i", map(int, fields[2::4]))
+        except (ValueError, OverflowError):
+            return False
+        self.x.extend(xs)
+        self.y.extend(ys)
+        # 行の開始位置 = 前行の開始 + 行の長さ + 改行
+        self._line_start.extend(accumulate(map((1).__add__, map(len, lines[:-1])), initial=pos))
+        return True
+
+    def _scan_block_re(self, pos: int, end: int) -> None:
+        """空行や列数違いを含むブロックは1行ずつ正規表現で拾う（4列に満たない行・座標が数でない行は読み飛ばす）。"""
+        for m in _TSV_FORT_RE.finditer(self._buf, pos, end):
+            self.x.append(int(m.group(1)))
+            self.y.append(int(m.group(2)))
+            self._line_start.append(m.start())
+
+    def _fields(self, i: int) -> list:
+        """i 行目を (名称, X, Y, ★, 残り) までタブで切ったバイト列。"""
+        start = self._line_start[i]
+        end = self._buf.find(b"\n", start)
+        return self._buf[start:end if end >= 0 else len(self._buf)].split(b"\t", 4)
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def name(self, i: int) -> str:
+        return self._fields(i)[0].decode("utf-8").strip()
+
+    def star(self, i: int) -> str:
+        return self._fields(i)[3].decode("utf-8").strip()
+
+    def __iter__(self):
+        for i in range(len(self.x)):
+            f = self._fields(i)
+            yield (self.x[i], self.y[i], f[0].decode("utf-8").strip(), f[3].decode("utf-8").strip(), self.kind)
+
+    def close(self) -> None:
+        if self._buf is not None:
+            self._buf.close()
+            self._buf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_tsv_forts_mmap(path: Path, kind: str) -> FortTable:
+    """砦リストTSVを mmap して FortTable で返す。大きなリスト向けの load_tsv_forts の代替。"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return FortTable(None, kind)
+        return FortTable(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), kind)
+
+
+def to_record(x, y, kind, name, star, regions: list) -> tuple:
+    """統合行: (地域, x, y, 種別, 名称, ★, MAP, 自動出兵SC)。w=w1, E側=c4（砦攻略システムと合わせる）"""
+    region = get_region(x, y, regions)
+    if "cw2" in kind:
+        map_url = f"{MAP_BASE_CW}?x={x}&y={y}"
+        auto_url = f"{AUTO_BASE_CW}?x={x}&y={y}"
+    else:
+        map_url = f"{MAP_BASE}?x={x}&y={y}"
+        auto_url = f"{AUTO_BASE}?x={x}&y={y}"
+    return (region, x, y, kind, name, star, map_url, auto_url)
+
+
+def load_sorted_rows(base_dir: Path, regions: list, max_rows_in_memory: int = SORT_MEMORY_ROWS) -> SortedRows:
+    """base_dir の砦リスト（cw2.txt, em6DATA.txt）を読み、統合行を並べ替えて返す。
+
+    並び: 地域順（北西→南東）、同一地域内は Y 降順・X 昇順（北から南、西から東）
+    """
+    with load_tsv_forts_mmap(base_dir / "cw2.txt", "砦(cw2)") as cw2_rows, load_tsv_forts_mmap(base_dir / "em6DATA.txt", "砦(em6)") as em6_rows:
+        records = (to_record(x, y, kind, name, star, regions) for table in (cw2_rows, em6_rows) for (x, y, name, star, kind) in table)
+        return sort_rows(records, regions, max_rows_in_memory)
+
+
+def main(base_dir: Path = BASE_DIR):
+    regions = load_regions(base_dir / "座標区分けリスト.txt")
+    all_rows = load_sorted_rows(base_dir, regions)
+
+    # CSV・一覧HTML・座標マップは互いに独立なジョブ（いずれも並べ替え済みの行を先頭から流す）。
+    # 行がディスク上のときだけ別プロセスで並列に書く（渡すのはチャンクのパスだけ）。メモリ上の行はジョブごとにコピーされ
+    # 並べ替えのメモリ予算を超えるので、このプロセスで順に書く
+    out_csv = base_dir / "遠征計画_座標別一覧.csv"
     # HTML 1枚シート出力（先頭500行＋見本で軽量に。全件はCSVで）
-    out_html = BASE_DIR / "遠征計画_座標別一覧.html"
-    build_html(all_rows, out_html, regions, max_rows=800)
-
+    out_html = base_dir / "遠征計画_座標別一覧.html"
     # 座標マップ（シート状配置）HTML 出力
-    out_map = BASE_DIR / "遠征計画_座標マップ.html"
-    build_map_html(all_rows, out_map)
+    out_map = base_dir / "遠征計画_座標マップ.html"
+    with all_rows:
+        try:
+            run_jobs([
+                ("CSV", partial(write_csv, all_rows, out_csv), ()),
+                ("一覧HTML", partial(build_html, list(islice(all_rows, LIST_PAGE_ROWS)), out_html, regions, max_rows=LIST_PAGE_ROWS), ()),
+                ("座標マップ", partial(build_map_html, all_rows, out_map), ()),
+            ], pool=shared_pool() if all_rows.on_disk else None)
+        except BuildError as e:
+            raise SystemExit(f"出力に失敗しました:\n{e}")
 
     print(f"CSV: {out_csv} ({len(all_rows)} 行)")
     print(f"HTML: {out_html}")
     print(f"座標マップ: {out_map}")
+    print(f"Service Worker: {write_service_worker(base_dir)}")
 
 
-def build_html(rows: list, path: Path, regions: list, max_rows: int = 800):
-    """座標別一覧の1枚シートHTMLを生成。cw / em を切り替え表示。"""
-    head = """<!DOCTYPE html>
+def write_csv(rows: list, path: Path) -> None:
+    """座標別一覧CSV（スプレッドシート取り込み用、BOM付き）を書き出す。"""
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["地域", "X", "Y", "種別", "名称", "★", "MAP", "自動出兵SC", "備考"])
+        for r in rows:
+            w.writerow([r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[7], ""])
+
+
+# 座標別一覧ページの表の前後。foot の {0} は表示件数、<!--FILTER_DATA--> は絞り込み用データ（_list_page_template で組み立てる）
+_LIST_HEAD = """<!DOCTYPE html>
 <html lang="ja">
 <head>
 <meta charset="UTF-8">
@@ -160,7 +379,7 @@ a:visited { color: #b58eff; }
 .region-toggle .region-btn { padding: 4px 10px; border-radius: 4px; border: 1px solid #444; background: #252540; color: #ccc; font-size: 12px; cursor: pointer; }
 .region-toggle .region-btn:hover { background: #2d2d4a; color: #fff; }
 .region-toggle .region-btn.active { background: #3d4a6e; border-color: #6e9ecc; color: #fff; }
-tr[data-region].region-hidden { display: none; }
+.region-toggle select { padding: 4px 8px; border-radius: 4px; border: 1px solid #444; background: #252540; color: #ccc; font-size: 12px; }
 </style>
 </head>
 <body>
@@ -174,6 +393,15 @@ tr[data-region].region-hidden { display: none; }
   <button type="button" class="region-btn active" data-region="">すべて</button>
   <!--REGION_BUTTONS-->
 </div>
+<div class="region-toggle" role="group" aria-label="★で絞り込み">
+  <label for="starMin">★</label>
+  <select id="starMin">
+    <option value="1">すべて</option>
+    <option value="3">★3以上</option>
+    <option value="5">★5以上</option>
+    <option value="7">★7以上</option>
+  </select>
+</div>
 <div class="wrap">
 <table>
 <thead><tr>
@@ -181,27 +409,51 @@ tr[data-region].region-hidden { display: none; }
 </tr></thead>
 <tbody>
 """
-    foot = """
+_LIST_FOOT = """
 </tbody>
 </table>
 </div>
 <div class="note">※ 全件は 遠征計画_座標別一覧.csv をスプレッドシートに取り込んで利用してください。HTMLは最大{0}件まで表示しています。</div>
+<script id="filterData" type="application/json"><!--FILTER_DATA--></script>
 <script>
 (function(){{
+/*BITSET_JS*/
+  var FILTER = JSON.parse(document.getElementById('filterData').textContent);
   var radios = document.querySelectorAll('input[name="listSwitch"]');
   var rows = document.querySelectorAll('tbody tr[data-list]');
   var regionBtns = document.querySelectorAll('.region-btn');
+  var starMin = document.getElementById('starMin');
   var currentRegion = '';
+  var n = FILTER.n, none = Bits.words(n), decoded = {{}};
+  /* 絞り込み値ごとのビットセット（初回使用時に復元）。データに無い値は空集合 */
+  function set(facet, value) {{
+    var k = facet + ':' + value;
+    if (!decoded[k]) {{
+      var b64 = (FILTER.sets[facet] || {{}})[value];
+      decoded[k] = b64 == null ? none : Bits.decode(b64, n);
+    }}
+    return decoded[k];
+  }}
+  function visibleSet() {{
+    var v = Bits.or(Bits.words(n), set('list', document.querySelector('input[name="listSwitch"]:checked').value));
+    if (currentRegion) Bits.and(v, set('region', currentRegion));
+    var minStar = parseInt(starMin.value, 10) || 1;
+    if (minStar > 1) {{
+      var stars = Bits.words(n);
+      Object.keys(FILTER.sets.star || {{}}).forEach(function(lv) {{ if (parseInt(lv, 10) >= minStar) Bits.or(stars, set('star', lv)); }});
+      Bits.and(v, stars);
+    }}
+    return v;
+  }}
+  /* 前回と表示が変わった行だけ class を付け替える */
+  var shown = Bits.all(n);
   function update() {{
-    var v = document.querySelector('input[name="listSwitch"]:checked').value;
-    rows.forEach(function(tr) {{
-      var listMatch = tr.getAttribute('data-list') === v;
-      var regionMatch = !currentRegion || tr.getAttribute('data-region') === currentRegion;
-      tr.classList.toggle('hidden', !listMatch);
-      tr.classList.toggle('region-hidden', !regionMatch);
-    }});
+    var next = visibleSet();
+    Bits.forEachChanged(shown, next, function(i, on) {{ rows[i].classList.toggle('hidden', !on); }});
+    shown = next;
   }}
   radios.forEach(function(r){{ r.addEventListener('change', update); }});
+  starMin.addEventListener('change', update);
   regionBtns.forEach(function(btn){{
     btn.addEventListener('click', function(){{
       regionBtns.forEach(function(b){{ b.classList.remove('active'); }});
@@ -211,43 +463,54 @@ tr[data-region].region-hidden { display: none; }
     }});
   }});
   update();
+  /*SW_REGISTER_JS*/
 }})();
 </script>
 </body>
 </html>
-""".format(max_rows)
+"""
 
-    def esc(s):
-        return (s or "").replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
 
+def _esc(s):
+    return (s or "").replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+@lru_cache(maxsize=None)
+def _list_page_template(max_rows: int) -> tuple:
+    """一覧ページの (表の前, 絞り込みデータの前, 後)。データに依らない部分なので1回だけ組み立てる。"""
     # 全方位の地域ボタンを常に表示（データに無い地域を押すと0件表示）
-    region_order = ["北西", "北", "北東", "西", "中原", "東", "南西", "南", "南東"]
     region_buttons_html = "\n".join(
-        f'  <button type="button" class="region-btn" data-region="{esc(r)}">{esc(r)}</button>' for r in region_order
+        f'  <button type="button" class="region-btn" data-region="{_esc(r)}">{_esc(r)}</button>' for r in REGION_ORDER
     )
-    head_final = head.replace("<!--REGION_BUTTONS-->", region_buttons_html)
+    head = _LIST_HEAD.replace("<!--REGION_BUTTONS-->", region_buttons_html)
+    foot = _LIST_FOOT.format(max_rows).replace("/*BITSET_JS*/", BITSET_JS.strip("\n")).replace("/*SW_REGISTER_JS*/", SW_REGISTER_JS)
+    before, _, after = foot.partition("<!--FILTER_DATA-->")
+    return head, before, after
 
+
+def build_html(rows: list, path: Path, regions: list, max_rows: int = 800):
+    """座標別一覧の1枚シートHTMLを生成。cw / em を切り替え表示。"""
     body_rows = []
-    for r in rows[:max_rows]:
+    facets = {"list": [], "region": [], "star": []}
+    for r in islice(rows, max_rows):
         region, x, y, kind, name, star, map_url, auto_url = r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[7]
-        data_list = "cw" if "cw2" in kind else "em"
+        data_list = list_of_kind(kind)
+        facets["list"].append(data_list)
+        facets["region"].append(region)
+        facets["star"].append(star_level(star))
         css = "kind-cw" if data_list == "cw" else "kind-em"
-        region_attr = esc(region) if region else ""
+        region_attr = _esc(region) if region else ""
         body_rows.append(
             f'<tr class="{css}" data-list="{data_list}" data-region="{region_attr}">'
-            f'<td>{esc(region)}</td><td class="num">{x}</td><td class="num">{y}</td><td>{esc(kind)}</td><td>{esc(name)}</td><td>{esc(star)}</td>'
-            f'<td><a href="{esc(map_url)}" target="_blank">MAP</a></td>'
-            f'<td><a href="{esc(auto_url)}" target="_blank">自動出兵SC</a></td><td></td></tr>'
+            f'<td>{_esc(region)}</td><td class="num">{x}</td><td class="num">{y}</td><td>{_esc(kind)}</td><td>{_esc(name)}</td><td>{_esc(star)}</td>'
+            f'<td><a href="{_esc(map_url)}" target="_blank">MAP</a></td>'
+            f'<td><a href="{_esc(auto_url)}" target="_blank">自動出兵SC</a></td><td></td></tr>'
         )
 
-    path.write_text(head_final + "\n".join(body_rows) + foot, encoding="utf-8")
-
-
-def _star_level(star_str: str) -> int:
-    """★8 -> 8, ★1 -> 1 を返す。"""
-    import re
-    m = re.search(r"★?(\d+)", star_str or "")
-    return int(m.group(1)) if m else 1
+    # 表の行順のビットセット（リスト・地域・★）。絞り込みはページ側で語単位の AND
+    filter_json = json.dumps(build_bitsets(facets, len(body_rows)), ensure_ascii=False).replace("</", "\\u003c/")
+    head, foot_before, foot_after = _list_page_template(max_rows)
+    path.write_text(head + "\n".join(body_rows) + foot_before + filter_json + foot_after, encoding="utf-8")
 
 
 def build_map_html(rows: list, path: Path) -> None:
@@ -256,8 +519,8 @@ def build_map_html(rows: list, path: Path) -> None:
     points = []
     for r in rows:
         region, x, y, kind, name, star = r[0], r[1], r[2], r[3], r[4], r[5]
-        list_id = "cw" if "cw2" in kind else "em"
-        star_num = _star_level(star)
+        list_id = list_of_kind(kind)
+        star_num = star_level(star)
         points.append({"x": x, "y": y, "name": name, "star": star, "starNum": star_num, "list": list_id})
 
     # 座標範囲（余白付き）
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+出力ジョブの実行。
+描画・書き出しを (名前, 関数, 依存ジョブ名) のジョブとして並べ、依存が済んだものから回す。
+既定はこのプロセスで順に実行する。ジョブは1つ 0.1 秒ほどで、ワーカーの起動（Windows は spawn で読み込み直し）と
+行の受け渡しの方が高くつくため。大きな入力のときだけ呼び出し側が shared_pool() を渡し、別プロセスで同時に回す
+（pure Python の CPU 処理なので、スレッドでは GIL で順番待ちになり速くならない）。
+失敗はまとめて1つの BuildError で報告する（失敗したジョブに依存するジョブは実行しない）。
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+
+class BuildError(Exception):
+    """1つ以上のジョブが失敗した。failures は ジョブ順の (ジョブ名, 例外) のリスト。"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__("\n".join(f"  - {name}: {type(e).__name__}: {e}" for name, e in failures))
+
+
+# 共有プールのワーカー数の上限。ジョブの大半は小さく、全体の時間は重い数個で決まる
+POOL_MAX_WORKERS = 4
+_pool = None
+
+
+class _InlineExecutor:
+    """プロセスを立てずにその場で実行する。"""
+
+    def submit(self, func, *args):
+        fut = Future()
+        try:
+            fut.set_result(func(*args))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+
+def cpu_count() -> int:
+    """このプロセスが使える CPU の数。"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def shared_pool():
+    """ジョブを別プロセスで回すプール。CPU が1つなら None（このプロセスで実行）。
+
+    最初に呼ばれたときに作り、以降はプロセスの終わりまで同じものを返す（expedition.py all の一覧・マップで使い回す）。
+    """
+    global _pool
+    if _pool is None and cpu_count() > 1:
+        _pool = ProcessPoolExecutor(max_workers=min(cpu_count(), POOL_MAX_WORKERS))
+    return _pool
+
+
+def run_jobs(jobs, pool=None):
+    """jobs: [(name, func, deps), ...]。func は deps の結果を順に引数で受け取る。
+
+    pool を省略するとこのプロセスで順に実行する。pool（shared_pool()）を渡すと func・引数・戻り値を
+    プロセス間で pickle して受け渡すので、func はモジュール直下の関数かその functools.partial にする。
+    戻り値は {name: 結果}。出力先はジョブごとに別なので、実行順に関わらず結果は同じになる。
+    """
+    order = {name: i for i, (name, _, _) in enumerate(jobs)}
+    pending = {name: (func, tuple(deps)) for name, func, deps in jobs}
+    results, failures, failed = {}, [], set()
+    ex = pool or _InlineExecutor()
+    running = {}
+    while pending or running:
+        for name in list(pending):
+            func, deps = pending[name]
+            if any(d in failed or d not in order for d in deps):
+                del pending[name]
+                failed.add(name)
+                failures.append((name, RuntimeError(f"依存ジョブが失敗または未定義: {', '.join(deps)}")))
+            elif all(d in results for d in deps):
+                del pending[name]
+                running[ex.submit(func, *[results[d] for d in deps])] = name
+        if not running:
+            # 残りは依存が循環していて永久に始まらない
+            for name in pending:
+                failed.add(name)
+                failures.append((name, RuntimeError("依存が循環しています")))
+            pending.clear()
+            continue
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for fut in done:
+            name = running.pop(fut)
+            try:
+                results[name] = fut.result()
+            except Exception as e:
+                failed.add(name)
+                failures.append((name, e))
+    if failures:
+        raise BuildError(sorted(failures, key=lambda f: order[f[0]]))
+    return results
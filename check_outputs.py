@@ -0,0 +1,466 @@
+# -*- coding: utf-8 -*-
+"""
+生成物の回帰チェックと性能予算。
+
+攻略状況 → 座標別一覧 → 座標マップ を一時ディレクトリで実際に回し、出力を読み戻して確かめる。
+  固定入力（FIXTURE_FILES）… 並べた行・マップの点・攻略状況と紐付け結果を golden/fixture.json と全件比較
+  同梱の実データ        … 同じ項目の件数とハッシュを golden/real.json と比較し、段ごとの時間・メモリを BUDGETS と比較
+  乱数入力（seed 固定）   … スナップショットは持たず、旧ローダーとの一致・外部ソートとの一致などの不変条件だけ確かめる
+どの入力でも、CSV・一覧HTML・マップの点・攻略状況の紐付けが互いに食い違わないことを確かめる。
+
+使い方:
+  python check_outputs.py                … チェック（失敗があれば終了コード 1）
+  python check_outputs.py --update       … 現在の出力で golden/*.json を作り直す（並びや紐付けを意図して変えたとき）
+  python check_outputs.py --seeds 1 2 3 --random-rows 20000
+"""
+import argparse
+import base64
+import contextlib
+import csv
+import hashlib
+import html
+import io
+import json
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import build_expedition_sheet as sheet
+import gen_map_from_csv as gen_map
+import make_fort_status_json as status_json
+from expedition_core import list_of_kind, star_level
+from search_index import normalize_name
+
+BASE_DIR = Path(__file__).parent
+GOLDEN_DIR = BASE_DIR / "golden"
+REAL_INPUTS = ["cw2.txt", "em6DATA.txt", "座標区分けリスト.txt"]
+# 実データの攻略状況は同梱の従来JSON（w1 は名前キー、e1 は座標キー）を砦攻略のCSVの形に戻して使う
+REAL_STATUS_JSON = {"w1": "fort_status.json", "e1": "fort_status_c4.json"}
+# 実データでの段ごとの予算（秒, tracemalloc のピークMB）。メモリは時間とは別にもう1回回して測る
+BUDGETS = {
+    "status": (0.5, 16),
+    "sheet": (1.5, 128),
+    "map": (2.0, 128),
+}
+
+# 固定入力。BOM・CRLF・空行・列の空白・★無し・地域の境界・区分け外・記号入りの名前・両リストで同じ座標を含む
+FIXTURE_FILES = {
+    "座標区分けリスト.txt": (
+        "中原(-400,400)(400,-400)\n北西(-401,401)(-1300,1300)\n北(-400,401)(400,1300)\n北東(401,401)(1300,1300)\n"
+        "西(-401,400)(-1300,-400)\n東(401,400)(1300,-400)\n南西(-401,-401)(-1300,-1300)\n南(-400,-401)(400,-1300)\n"
+        "南東(401,-401)(1300,-1300)"
+    ),
+    "cw2.txt": (
+        "\ufeffNPC名\tX座標\tY座標\t★\n"
+        "北西砦818\t-818\t818\t★5\n"
+        "東砦1180\t1180\t0\t★8\n"
+        "境界砦\t400\t400\t★3\n"
+        "境界外砦\t401\t400\t★3\n"
+        "同座標砦\t100\t-100\t★1\n"
+        "空白入り \t  -20 \t 30\t ★4 \n"
+        "\n"
+        "不正な行\tx\t1\t★1\n"
+        "★無し砦\t0\t-1200\t\n"
+        "区分け外\t0\t1400\t★2\n"
+    ),
+    # em6 は空行・座標が数でない行を置かず（一括分割の経路を通す）、5列と3列の行で合計列数だけが揃う場合を確かめる
+    "em6DATA.txt": (
+        "NPC名\tX座標\tY座標\t★\r\n"
+        "洛陽\t0\t0\t★9\r\n"
+        "許昌\t1100\t1100\t★8\r\n"
+        "A&B<\"砦\">\t-1100\t-1100\t★10\r\n"
+        "同座標砦\t100\t-100\t★2\r\n"
+        "南砦\t0\t-401\t7\r\n"
+        "5列の砦\t-30\t40\t★3\t備考\r\n"
+        "100\t200\t★3\r\n"
+        "北砦\t-400\t401\t★6\r\n"
+        "末尾★無し\t10\t10\t\r\n"
+    ),
+    "npc_strategy_all.csv": (
+        "event_id,npc_name,strategy_status,base1_x,base1_y\n"
+        "w1,洛陽,失,0,0\n"
+        "w1,許昌,攻略済,1100,1100\n"
+        "w1,南砦,未攻略,0,-401\n"
+        "w1,北砦,,-400,401\n"
+        "e1,許昌：東砦1180,攻略済,1180,0\n"
+        "e1,北西砦818,失,-818,818\n"
+        "e1,座標不正,攻略済,x,1\n"
+        "e1,同座標砦,未攻略,100,-100\n"
+    ),
+}
+FIXTURE_STATUS_ARGS = ["npc_strategy_all.csv"]
+
+
+# ---------- 実行と計測 ----------
+
+def measure(func, trace_memory=False) -> float:
+    """func() を出力を捨てて実行し、経過秒（trace_memory なら tracemalloc のピークMB）を返す。"""
+    if trace_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+    finally:
+        elapsed = time.perf_counter() - t0
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return peak / 1e6 if trace_memory else elapsed
+
+
+def run_pipeline(work: Path, status_args, trace_memory=False) -> dict:
+    """work の入力から 攻略状況 → 一覧 → マップ を生成し、段ごとの (秒, MB または None) を返す。
+
+    tracemalloc は処理を何倍も遅くするので、メモリは同じ段をもう1回回して測る（出力は同じ内容で上書きされる）。
+    書き出しジョブは大きな入力のときだけ別プロセスで動く。ここで使う入力の大きさでは、すべてこのプロセスで動いて tracemalloc に入る。
+    """
+    stages = [
+        ("sheet", lambda: sheet.main(work)),
+        ("map", lambda: gen_map.main(work)),
+    ]
+    if status_args is not None:
+        stages.insert(0, ("status", lambda: status_json.main([str(work / a) for a in status_args], base_dir=work)))
+    return {
+        stage: (measure(func), measure(func, trace_memory=True) if trace_memory else None)
+        for stage, func in stages
+    }
+
+
+# ---------- 出力の読み戻し ----------
+
+def read_data_script(path: Path):
+    """map_data/*.js（(window.MAP_DATA = …).key = JSON;）の JSON 部分。"""
+    text = path.read_text(encoding="utf-8")
+    return json.loads(text[text.index(" = ", text.index(").")) + 3:].rstrip().rstrip(";"))
+
+
+def read_fort_chunks(path: Path) -> list:
+    """map_data/fort_chunks_<リスト>.js（1行1チャンクの MAP_DATA_CHUNK([...]);）の点を読み込み順につなげる。"""
+    points = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        points += json.loads(line[line.index("(") + 1:line.rindex(")")])
+    return points
+
+
+def unvarint(b64: str) -> list:
+    """search_index._varint（delta=False）の逆。"""
+    out, v, shift = [], 0, 0
+    for c in base64.b64decode(b64):
+        v |= (c & 0x7F) << shift
+        shift += 7
+        if not c & 0x80:
+            out.append(v)
+            v, shift = 0, 0
+    return out
+
+
+def bits_to_indices(b64: str) -> list:
+    data = base64.b64decode(b64)
+    return [i for i in range(len(data) * 8) if data[i >> 3] >> (i & 7) & 1]
+
+
+_TR_RE = re.compile(r'<tr class="[^"]*" data-list="(\w+)" data-region="([^"]*)">(.*?)</tr>')
+_TD_RE = re.compile(r'<td[^>]*>(.*?)</td>')
+_HREF_RE = re.compile(r'<a href="([^"]*)"')
+
+
+def read_list_page(path: Path) -> list:
+    """一覧HTMLの表を CSV と同じ列の並び（地域, X, Y, 種別, 名称, ★, MAP, 自動出兵SC, 備考）で読む。"""
+    rows = []
+    for m in _TR_RE.finditer(path.read_text(encoding="utf-8")):
+        cells = _TD_RE.findall(m.group(3))
+        row = [html.unescape(c) for c in cells[:6]]
+        row += [html.unescape(_HREF_RE.match(c).group(1)) if _HREF_RE.match(c) else c for c in cells[6:8]]
+        rows.append((m.group(1), html.unescape(m.group(2)), row + cells[8:]))
+    return rows
+
+
+def snapshot(work: Path) -> dict:
+    """生成物を意味のある単位（行・点・攻略状況・紐付け）に読み戻す。"""
+    with open(work / gen_map.CSV_NAME, encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.reader(f))
+    forts = read_data_script(work / "map_data" / "forts_em.js")
+    statuses = {}
+    for event in sorted({gen_map.STATUS_EVENT[m] for m in ("em", "cw")}):
+        p = status_json.slice_path(event, work)
+        if p.exists():
+            statuses[event] = status_json.decode_status(json.loads(p.read_text(encoding="utf-8")))
+    joined, points = [], []
+    for list_mode in ("em", "cw"):
+        # ビットセットの番号はリストごとの点の並び
+        list_points = read_fort_chunks(work / "map_data" / f"fort_chunks_{list_mode}.js")
+        sets = read_data_script(work / "map_data" / f"status_{list_mode}.js")["sets"]
+        for st, b64 in sorted(sets.items()):
+            for i in bits_to_indices(b64):
+                joined.append([list_mode, list_points[i]["x"], list_points[i]["y"], list_points[i]["n"], st])
+        points += list_points
+    return {
+        "rows": rows,
+        "points": points,
+        "view": forts["view"],
+        "statuses": statuses,
+        "joined": sorted(joined),
+    }
+
+
+# ---------- 不変条件 ----------
+
+def check_consistency(work: Path, snap: dict, status_maps: dict) -> list:
+    """CSV・一覧HTML・マップの点・攻略状況の紐付けが互いに合っているか。→ 問題の説明のリスト。"""
+    errors = []
+    header, rows = snap["rows"][0], snap["rows"][1:]
+    if header != ["地域", "X", "Y", "種別", "名称", "★", "MAP", "自動出兵SC", "備考"]:
+        errors.append(f"CSVのヘッダーが違う: {header}")
+    page = read_list_page(work / "遠征計画_座標別一覧.html")
+    if len(page) != min(len(rows), sheet.LIST_PAGE_ROWS):
+        errors.append(f"一覧HTMLの行数 {len(page)} が CSV の先頭 {min(len(rows), sheet.LIST_PAGE_ROWS)} 行と合わない")
+    for i, ((data_list, data_region, cells), row) in enumerate(zip(page, rows)):
+        if cells != row or data_list != list_of_kind(row[3]) or data_region != row[0]:
+            errors.append(f"一覧HTML {i} 行目が CSV と違う: {cells} / {row}")
+            break
+    points = snap["points"]
+    if len(points) != len(rows):
+        errors.append(f"マップの点 {len(points)} 件が CSV {len(rows)} 行と合わない")
+    # マップの点はリストごと（em → cw）に、読み込み順（★が高い → 全体表示の中心に近い）に並べ替えてある
+    expect_points = [
+        {"x": int(row[1]), "y": int(row[2]), "n": row[4], "s": row[5], "st": star_level(row[5]),
+         "l": list_of_kind(row[3]), "u": row[7], "m": row[6]}
+        for row in rows
+    ]
+    view = snap["view"]
+    order = gen_map.load_order(expect_points, view["xMin"] + view["w"] / 2, view["yMax"] - view["h"] / 2)
+    ordered = [expect_points[j] for j in order]
+    for i, (p, expect) in enumerate(zip(points, [p for m in ("em", "cw") for p in ordered if p["l"] == m])):
+        if p != expect:
+            errors.append(f"マップの点 {i} が CSV を読み込み順に並べたものと違う: {p} / {expect}")
+            break
+    for list_mode in ("em", "cw"):
+        list_points = [p for p in points if p["l"] == list_mode]
+        if any(a["st"] < b["st"] for a, b in zip(list_points, list_points[1:])):
+            errors.append(f"マップの点（{list_mode}）が★の高い順に並んでいない")
+    expect_joined = sorted(
+        [p["l"], p["x"], p["y"], p["n"], st]
+        for p in points
+        for st in [gen_map.fort_status(p, status_maps[p["l"]])]
+        if st
+    )
+    if snap["joined"] != expect_joined:
+        errors.append(f"攻略状況の紐付けが参照実装と違う（{len(snap['joined'])} 件 / {len(expect_joined)} 件）")
+    return errors
+
+
+def check_loaders_and_sort(work: Path, spill_rows: int) -> list:
+    """mmap ローダーと旧ローダー、外部マージソートとメモリ上のソートが同じ結果になるか。"""
+    errors = []
+    for name, kind in (("cw2.txt", "砦(cw2)"), ("em6DATA.txt", "砦(em6)")):
+        old = sheet.load_tsv_forts(work / name, kind)
+        with sheet.load_tsv_forts_mmap(work / name, kind) as table:
+            new = list(table)
+        if old != new:
+            diff = next((i for i, (a, b) in enumerate(zip(old, new)) if a != b), min(len(old), len(new)))
+            errors.append(f"{name}: mmap ローダーが旧ローダーと違う（{len(new)} 件 / {len(old)} 件、[{diff}] から）")
+    for x, y in ((1 << 15, 0), (0, -(1 << 15))):
+        try:
+            sheet.pack_sort_key(0, x, y)
+            errors.append(f"並べ替えキーに収まらない座標 ({x}, {y}) が ValueError にならない")
+        except ValueError:
+            pass
+    regions = sheet.load_regions(work / "座標区分けリスト.txt")
+    with sheet.load_sorted_rows(work, regions) as in_memory, sheet.load_sorted_rows(work, regions, spill_rows) as spilled:
+        a, b = list(in_memory), list(spilled)
+    if a != b:
+        errors.append(f"外部マージソート（{spill_rows} 行ずつ）がメモリ上のソートと違う")
+    ranks = sheet.region_ranks(regions)
+    reference = sorted(a, key=lambda r: (ranks[r[0]], -r[2], r[1]))
+    if a != reference:
+        errors.append("並びが 地域順→Y降順→X昇順 になっていない")
+    return errors
+
+
+def check_search(work: Path) -> list:
+    """検索索引の1文字の番号列が、その文字を含む砦を 最初の一致位置 → 名前の長さ → 番号 の順に並べたものか。"""
+    errors = []
+    for list_mode in ("em", "cw"):
+        names = [normalize_name(p["n"]) for p in read_fort_chunks(work / "map_data" / f"fort_chunks_{list_mode}.js")]
+        chars = read_data_script(work / "map_data" / f"search_{list_mode}.js")["chars"]
+        expect_chars = {c for name in names for c in name}
+        if set(chars) != expect_chars:
+            errors.append(f"検索索引（{list_mode}）の1文字の見出しが名前の文字と違う（{len(chars)} 件 / {len(expect_chars)} 件）")
+        for c, b64 in chars.items():
+            raw, ids, k = unvarint(b64), [], 0
+            while k < len(raw):
+                n, prev = raw[k], -1
+                for d in raw[k + 1:k + 1 + n]:
+                    prev += d + 1
+                    ids.append(prev)
+                k += 1 + n
+            expect = sorted((i for i, name in enumerate(names) if c in name), key=lambda i: (names[i].index(c), len(names[i]), i))
+            if ids != expect:
+                errors.append(f"検索索引（{list_mode}）の「{c}」の並びが違う")
+                break
+    return errors
+
+
+def check_status_roundtrip(work: Path, status_args) -> list:
+    """攻略状況: 語彙表での符号化を戻すと CSV から読んだ対応と同じになるか。"""
+    events = {}
+    for default_event, path in status_json.parse_sources([str(work / a) for a in status_args]):
+        err = status_json.read_statuses(path, default_event, events)
+        if err:
+            return [f"{path.name}: {err}"]
+    bundle = status_json.encode_events(events)
+    errors = []
+    for event, (_, m) in events.items():
+        decoded = status_json.decode_status(dict(bundle["events"][event], v=bundle["v"]))
+        if decoded != m:
+            errors.append(f"攻略状況 {event}: 符号化して戻した結果が違う")
+    # 途中でエラーになるファイルは1行も足さない（前半だけで切り出しを上書きしない）
+    bad = work / "status_bad.csv"
+    bad.write_text("event_id,npc_name,strategy_status\nw1,A,未攻略\ne1,B,攻略済\nw1,C,失\n", encoding="utf-8")
+    partial_events = {"w1": ("name", {"Z": "攻略済"})}
+    if not status_json.read_statuses(bad, "w1", partial_events) or partial_events != {"w1": ("name", {"Z": "攻略済"})}:
+        errors.append(f"攻略状況: エラーになったファイルの行が残った {partial_events}")
+    return errors
+
+
+# ---------- 入力 ----------
+
+def write_fixture(work: Path) -> None:
+    for name, text in FIXTURE_FILES.items():
+        (work / name).write_bytes(text.encode("utf-8"))
+
+
+def write_random(work: Path, seed: int, n: int) -> list:
+    """seed から砦リスト・区分け・攻略状況CSVを作る。→ 攻略状況の引数。"""
+    rnd = random.Random(seed)
+    (work / "座標区分けリスト.txt").write_bytes(FIXTURE_FILES["座標区分けリスト.txt"].encode("utf-8"))
+    chars = "東西南北砦城関門山川A&<>\"' 1"
+    picked = {"w1": [], "e1": []}
+    for name, event, eol in (("cw2.txt", "e1", "\n"), ("em6DATA.txt", "w1", rnd.choice(["\n", "\r\n"]))):
+        lines = ["NPC名\tX座標\tY座標\t★"]
+        for _ in range(n):
+            fort = "".join(rnd.choice(chars) for _ in range(rnd.randint(1, 8))).strip() or "砦"
+            x, y = rnd.randint(-1400, 1400), rnd.randint(-1400, 1400)
+            star = rnd.choice(["★{}".format(rnd.randint(1, 10)), str(rnd.randint(1, 9)), "", " ★3 "])
+            pad = rnd.choice(["", " "])
+            lines.append(f"{fort}\t{pad}{x}{pad}\t{y}\t{star}")
+            if rnd.random() < 0.01:
+                lines.append(rnd.choice(["", "壊れた行", f"{fort}\tx\t{y}\t★1"]))
+            if rnd.random() < 0.3:
+                picked[event].append((fort, x, y))
+        (work / name).write_bytes((eol.join(lines) + eol).encode("utf-8"))
+    with open(work / "npc_strategy_all.csv", "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["event_id", "npc_name", "strategy_status", "base1_x", "base1_y"])
+        for event, forts in picked.items():
+            for fort, x, y in forts:
+                w.writerow([event, fort, rnd.choice(["攻略済", "失", "未攻略", ""]), x, y])
+    return ["npc_strategy_all.csv"]
+
+
+# ---------- スナップショット ----------
+
+def digest(obj) -> str:
+    return hashlib.sha256(json.dumps(obj, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def summarize(snap: dict) -> dict:
+    """実データ用: 項目ごとの件数とハッシュ。"""
+    return {key: {"count": len(value), "sha256": digest(value)} for key, value in snap.items()}
+
+
+def compare(label: str, golden_path: Path, current: dict, update: bool) -> list:
+    if update:
+        GOLDEN_DIR.mkdir(exist_ok=True)
+        golden_path.write_text(json.dumps(current, ensure_ascii=False, indent=1, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"  更新: {golden_path}")
+        return []
+    if not golden_path.exists():
+        return [f"{label}: {golden_path.name} がありません（--update で作成）"]
+    golden = json.loads(golden_path.read_text(encoding="utf-8"))
+    errors = []
+    for key in sorted(set(golden) | set(current)):
+        a, b = golden.get(key), json.loads(json.dumps(current.get(key), ensure_ascii=False))
+        if a == b:
+            continue
+        if isinstance(a, list) and isinstance(b, list):
+            i = next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+            where = f"[{i}]: {a[i] if i < len(a) else '（無し）'} → {b[i] if i < len(b) else '（無し）'}"
+            errors.append(f"{label}: {key} がスナップショットと違う（{len(a)} 件 → {len(b)} 件、{where}）")
+        else:
+            errors.append(f"{label}: {key} がスナップショットと違う: {a} → {b}")
+    return errors
+
+
+# ---------- 実行 ----------
+
+def check_case(label, prepare, *, golden=None, summary=False, budgets=None, update=False, spill_rows=7):
+    """prepare(work) で入力を置き、生成して確かめる。→ 問題の説明のリスト。"""
+    with tempfile.TemporaryDirectory(prefix="expedition_check_") as tmp:
+        work = Path(tmp)
+        status_args = prepare(work)
+        stats = run_pipeline(work, status_args, trace_memory=budgets is not None)
+        snap = snapshot(work)
+        status_maps = {m: gen_map.load_status_map(m, work) for m in ("em", "cw")}
+        errors = check_consistency(work, snap, status_maps)
+        errors += check_loaders_and_sort(work, spill_rows)
+        errors += check_search(work)
+        if status_args is not None:
+            errors += check_status_roundtrip(work, status_args)
+        if golden is not None:
+            errors += compare(label, GOLDEN_DIR / golden, summarize(snap) if summary else snap, update)
+    for stage, (sec, mb) in stats.items():
+        limit = (budgets or {}).get(stage)
+        over = limit is not None and (sec > limit[0] or mb > limit[1])
+        print(f"  {stage:7s} {sec:6.2f} 秒" + (f" {mb:7.1f} MB" if mb is not None else "") + ("  予算超過" if over else ""))
+        if over:
+            errors.append(f"{label}: {stage} が予算超過（{sec:.2f} 秒 / {mb:.1f} MB、予算 {limit[0]} 秒 / {limit[1]} MB）")
+    return [e if e.startswith(label) else f"{label}: {e}" for e in errors]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成物の回帰チェックと性能予算")
+    parser.add_argument("--update", action="store_true", help="golden/*.json を現在の出力で作り直す")
+    parser.add_argument("--seeds", type=int, nargs="*", default=[1, 2, 3], help="乱数入力の seed")
+    parser.add_argument("--random-rows", type=int, default=3000, help="乱数入力の1リストあたりの行数")
+    parser.add_argument("--skip-real", action="store_true", help="同梱の実データを使うチェックを飛ばす")
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    def copy_real(work):
+        for name in REAL_INPUTS:
+            shutil.copy(BASE_DIR / name, work / name)
+        with open(work / "npc_strategy_all.csv", "w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["event_id", "npc_name", "strategy_status", "base1_x", "base1_y"])
+            for event, name in REAL_STATUS_JSON.items():
+                for key, st in json.loads((BASE_DIR / name).read_text(encoding="utf-8")).items():
+                    x, _, y = key.partition(",") if status_json.EVENT_KEYS[event] == "coord" else ("", "", "")
+                    w.writerow([event, key, st, x, y])
+        return ["npc_strategy_all.csv"]
+
+    cases = [("固定入力", dict(prepare=lambda w: write_fixture(w) or FIXTURE_STATUS_ARGS, golden="fixture.json"))]
+    if not args.skip_real:
+        cases.append(("実データ", dict(prepare=copy_real, golden="real.json", summary=True, budgets=BUDGETS, spill_rows=1000)))
+    for seed in args.seeds:
+        cases.append((f"乱数 seed={seed}", dict(prepare=lambda w, s=seed: write_random(w, s, args.random_rows), spill_rows=args.random_rows // 3 or 1)))
+
+    errors = []
+    for label, kw in cases:
+        print(label)
+        errors += check_case(label, update=args.update, **kw)
+    if errors:
+        print("\n失敗:")
+        for e in errors:
+            print("  -", e)
+        raise SystemExit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+遠征システムのビルドをまとめて実行する入口。
+
+使い方:
+  python expedition.py all                 … 攻略状況 → 座標別一覧 → 座標マップ を1プロセスで続けて生成
+  python expedition.py status [CSV ...]    … make_fort_status_json.py と同じ（引数も同じ）
+  python expedition.py sheet               … build_expedition_sheet.py と同じ
+  python expedition.py map                 … gen_map_from_csv.py と同じ
+
+各スクリプトは使うコマンドのときだけ読み込む（status だけなら一覧・マップ側は読み込まない）。
+定期実行（タスクスケジューラ・cron など）は all を1回呼べば、インタプリタの起動は1回で済む。
+"""
+import argparse
+import sys
+
+
+def run_status(args):
+    import make_fort_status_json
+    make_fort_status_json.main(args.csv)
+
+
+def run_sheet(args):
+    import build_expedition_sheet
+    build_expedition_sheet.main()
+
+
+def run_map(args):
+    import gen_map_from_csv
+    gen_map_from_csv.main()
+
+
+def run_all(args):
+    # マップは一覧のCSVと攻略状況を読むので、この順に回す
+    run_status(args)
+    run_sheet(args)
+    run_map(args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="expedition.py", description="遠征計画の一覧・マップ・攻略状況を生成する")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("all", help="攻略状況 → 座標別一覧 → 座標マップ")
+    p.set_defaults(func=run_all, csv=[])
+    p = sub.add_parser("status", help="砦攻略のCSVから攻略状況JSONを生成")
+    p.add_argument("csv", nargs="*", help="CSV（event=パス で event_id 列の無いCSVの event を指定）。省略時は既定の候補")
+    p.set_defaults(func=run_status)
+    sub.add_parser("sheet", help="座標別一覧（CSV・HTML）を生成").set_defaults(func=run_sheet)
+    sub.add_parser("map", help="座標マップを生成").set_defaults(func=run_map)
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
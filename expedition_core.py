@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+ビルドスクリプト共通の解析処理。
+正規表現は読み込み時に1回だけコンパイルし、一覧（build_expedition_sheet）・マップ（gen_map_from_csv）の両方から使う。
+"""
+import re
+from pathlib import Path
+
+# ★表記（★8、8 など）の最初の数字列
+_STAR_RE = re.compile(r"★?(\d+)")
+# 座標区分けリストの1行: 地域名(x1,y1)(x2,y2)
+_REGION_LINE_RE = re.compile(r"(.+?)\((-?\d+),(-?\d+)\)\((-?\d+),(-?\d+)\)")
+
+
+def star_level(star_str: str) -> int:
+    """★8 -> 8, ★1 -> 1 を返す。数字が無ければ 1。"""
+    m = _STAR_RE.search(star_str or "")
+    return int(m.group(1)) if m else 1
+
+
+def list_of_kind(kind: str) -> str:
+    """種別 → リスト（cw = 砦(cw2)・c4 用、em = 砦(em6)・w 用）。"""
+    return "cw" if "cw2" in kind else "em"
+
+
+def load_regions(path: Path) -> list:
+    """座標区分けリスト.txt を読み、地域の矩形リストを返す。"""
+    regions = []
+    for line in path.read_text(encoding="utf-8").strip().splitlines():
+        m = _REGION_LINE_RE.match(line.strip())
+        if not m:
+            continue
+        name, x1, y1, x2, y2 = m.group(1), int(m.group(2)), int(m.group(3)), int(m.group(4)), int(m.group(5))
+        x_min, x_max = min(x1, x2), max(x1, x2)
+        y_min, y_max = min(y1, y2), max(y1, y2)
+        regions.append((name.strip(), x_min, x_max, y_min, y_max))
+    return regions
+
+
+def get_region(x: int, y: int, regions: list) -> str:
+    for name, x_min, x_max, y_min, y_max in regions:
+        if x_min <= x <= x_max and y_min <= y <= y_max:
+            return name
+    return ""
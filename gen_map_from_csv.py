@@ -1,42 +1,162 @@
 # -*- coding: utf-8 -*-
-"""CSV から 遠征計画_座標マップ.html を生成（Canvas 描画で軽量）。"""
+"""CSV から 遠征計画_座標マップ.html を生成（Canvas 描画で軽量）。
+
+ページは小さな殻HTMLで、描画処理（map_app.js / map_app.css）とデータ（map_data/*_<リスト>.js）は別ファイル。
+いずれも内容が変わったときだけ書き換え、殻からは内容のハッシュ付きURLで参照する。
+データはリスト（em / cw）ごとに分け、ページは自分のリストの分だけを読む。
+砦の点は優先度順（★が高い → 最初の表示の中心に近い）の小さなチャンクに分け、ページは届いたチャンクから描く。
+"""
+import base64
 import csv
 import json
-import re
+import zlib
+from functools import lru_cache, partial
 from pathlib import Path
 
+from bitset_index import BITSET_JS, build_bitsets
+from build_jobs import BuildError, run_jobs, shared_pool
+from expedition_core import list_of_kind, star_level
+from make_fort_status_json import decode_status, slice_path
+from search_index import SEARCH_JS, build_search_index
+from service_worker import SW_REGISTER_JS, versioned_url, write_service_worker
+
 BASE = Path(__file__).parent
-CSV_PATH = BASE / "遠征計画_座標別一覧.csv"
+CSV_NAME = "遠征計画_座標別一覧.csv"
 # URL別に出力（砦攻略管理と同様）。w1 用・c4 用で別ページにし、機能の混乱を避ける
-OUT_PATH_W1 = BASE / "遠征計画_座標マップ_w1.html"
-OUT_PATH_C4 = BASE / "遠征計画_座標マップ_c4.html"
-OUT_PATH = BASE / "遠征計画_座標マップ.html"  # 従来URL用＝w1 と同じ内容
+MAP_PAGES = [
+    ("em", "遠征計画_座標マップ_w1.html"),
+    ("cw", "遠征計画_座標マップ_c4.html"),
+    ("em", "遠征計画_座標マップ.html"),  # 従来URL用＝w1 と同じ内容
+]
 
 # 完全自動連動: 砦攻略のAPIを指定するとマップが常に最新の攻略状況を取得する（未設定時は同梱の fort_status.json を使用）
 FORT_STATUS_URL = ""   # w用。例: "https://npc-strategy-sheet.vercel.app/api/fort_status"
 FORT_STATUS_URL_CW = "https://npc-strategy-sheet.vercel.app/api/fort_status?event=e1"  # c4用。砦攻略 NPC攻略シート event=e1 のデータ（Supabase）
+# 同梱の攻略状況: リストごとの event の切り出し（make_fort_status_json.py が生成）。無ければ従来の単独JSON
+STATUS_EVENT = {"em": "w1", "cw": "e1"}
+LEGACY_STATUS_FILES = {"em": "fort_status.json", "cw": "fort_status_c4.json"}
+
+# 低ズーム時は砦を1件ずつ描かず、ビルド時に集計した密度ヒートマップを描く
+MAP_EXTENT = 1300  # マップは ±1300
+HEAT_CELLS = (64, 32, 16)  # ピラミッド各段のセル幅（マップ座標）。粗い段から順に
+# ★帯は地図の「★n以上」の選択肢（3・5・7）の境目に合わせる。ページは絞り込みに合う帯・状態のレイヤーだけを足して描く
+HEAT_STAR_BANDS = (("1-2", 1, 2), ("3-4", 3, 4), ("5-6", 5, 6), ("7+", 7, 99))
+# 画面上で絞り込みに合う砦1件あたりの面積（px²）がこれ未満ならヒートマップ（砦が約20px間隔より密に並ぶ縮尺）。
+# 画面幅・絞り込みに応じて切り替わる。ヒートマップ表示中のタップ・クリックは HEAT_HIT_PX 以内で最も近い砦を選ぶ
+HEAT_PX_PER_FORT = 400
+HEAT_HIT_PX = 12
+DONE_STATUSES = ("攻略済", "失")
+# 砦の点のチャンク（fort_chunks_<リスト>.js の1行）の件数。最初の描画を早くするため先頭は小さく、倍々で FORT_CHUNK_MAX まで
+FORT_CHUNK_FIRST = 256
+FORT_CHUNK_MAX = 2048
+# 点がこれ以上のときだけ出力ジョブを別プロセスで並列に回す。少ないうちはワーカーの起動と点の受け渡しの方が高くつく
+PARALLEL_MIN_POINTS = 200_000
+# 以前のビルドが書いた全リスト共通のデータ。残っていると Service Worker が事前キャッシュし続けるので消す
+OBSOLETE_DATA_FILES = ("map_data/forts.js", "map_data/fort_chunks.js")
+
+
+def status_files(list_id):
+    """list_id の同梱攻略状況ファイル名（優先順）。"""
+    return [slice_path(STATUS_EVENT[list_id]).name, LEGACY_STATUS_FILES[list_id]]
+
+
+def load_status_map(list_id, base_dir=BASE):
+    """同梱の攻略状況を {キー: 状況} で読む。どれも無い・壊れている場合は空。"""
+    for name in status_files(list_id):
+        try:
+            return decode_status(json.loads((base_dir / name).read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return {}
+
 
+def fort_status(p, status_map):
+    """マップ側と同じ規則で砦の攻略状況を引く（c4 は座標キー優先）。"""
+    if p["l"] == "cw":
+        return status_map.get(f"{p['x']},{p['y']}") or status_map.get(p["n"])
+    return status_map.get(p["n"])
 
-def star_level(s):
-    m = re.search(r"★?(\d+)", s or "")
-    return int(m.group(1)) if m else 1
 
+def star_band(st):
+    for band, lo, hi in HEAT_STAR_BANDS:
+        if lo <= st <= hi:
+            return band
+    return HEAT_STAR_BANDS[0][0]
 
-def main():
+
+def build_heat_tiles(points, list_id, status_map):
+    """list_id の砦を ★帯×攻略状況ごとに2Dヒストグラム化し、段ごとに zlib+base64 で返す。
+
+    各段は n×n セル（北西が先頭の行優先）。レイヤーは layers の順に連結して圧縮する。
+    セル値は 255 で頭打ち（描画の濃淡にしか使わない）。
+    """
+    layer_keys = [f"{band}:{state}" for band, _, _ in HEAT_STAR_BANDS for state in ("open", "done")]
+    binned = []
+    for p in points:
+        if p["l"] != list_id:
+            continue
+        if abs(p["x"]) > MAP_EXTENT or abs(p["y"]) > MAP_EXTENT:
+            continue
+        state = "done" if fort_status(p, status_map) in DONE_STATUSES else "open"
+        binned.append((p["x"] + MAP_EXTENT, MAP_EXTENT - p["y"], layer_keys.index(f"{star_band(p['st'])}:{state}")))
+
+    levels = []
+    for cell in HEAT_CELLS:
+        n = 2 * MAP_EXTENT // cell + 1
+        size = n * n
+        counts = bytearray(size * len(layer_keys))
+        for gx, gy, layer in binned:
+            i = layer * size + (gy // cell) * n + gx // cell
+            if counts[i] < 255:
+                counts[i] += 1
+        levels.append({
+            "cell": cell,
+            "n": n,
+            "z": base64.b64encode(zlib.compress(bytes(counts), 9)).decode("ascii"),
+        })
+    return {"x0": -MAP_EXTENT, "y0": MAP_EXTENT, "pxPerFort": HEAT_PX_PER_FORT, "hitPx": HEAT_HIT_PX, "layers": layer_keys, "levels": levels}
+
+
+def load_points(csv_path):
+    """座標別一覧CSV → マップの点のリスト。点の並びはCSVの行順。"""
     points = []
-    with open(CSV_PATH, encoding="utf-8-sig") as f:
+    with open(csv_path, encoding="utf-8-sig") as f:
         r = csv.DictReader(f)
         for row in r:
             x, y = int(row["X"]), int(row["Y"])
             kind = row["種別"]
-            list_id = "cw" if "cw2" in kind else "em"
+            list_id = list_of_kind(kind)
             auto_url = (row.get("自動出兵SC") or "").strip()
             map_url = (row.get("MAP") or "").strip()
             points.append({
                 "x": x, "y": y, "n": row["名称"], "s": row["★"],
                 "st": star_level(row["★"]), "l": list_id, "u": auto_url, "m": map_url
             })
+    return points
+
+
+def load_order(points, cx, cy):
+    """ページで読み込む順（FORT_DATA の並び）の添字: ★が高い順、同じ★なら (cx, cy) に近い順、残りはCSVの行順。"""
+    return sorted(range(len(points)), key=lambda i: (-points[i]["st"], (points[i]["x"] - cx) ** 2 + (points[i]["y"] - cy) ** 2, i))
+
+
+def fort_chunks_script(points) -> str:
+    """点を1行1チャンクの「MAP_DATA_CHUNK([...]);」にする。
 
+    ページは fetch で流し読みして行が揃うたびに括弧の中を JSON として解釈し、
+    fetch できない file:// では同じファイルを <script src> で読む（行ごとに MAP_DATA_CHUNK が呼ばれる）。
+    """
+    lines = []
+    start, size = 0, FORT_CHUNK_FIRST
+    while start < len(points):
+        lines.append(f"MAP_DATA_CHUNK({json.dumps(points[start:start + size], ensure_ascii=False, separators=(',', ':'))});")
+        start += size
+        size = min(size * 2, FORT_CHUNK_MAX)
+    return "\n".join(lines) + "\n"
+
+
+def main(base_dir=BASE):
+    points = load_points(base_dir / CSV_NAME)
     xs = [p["x"] for p in points]
     ys = [p["y"] for p in points]
     x_min, x_max = min(xs), max(xs)
@@ -58,52 +178,121 @@ def main():
 
     grid_step = 400 if (w > 2000 or h > 2000) else 200
 
-    # JSON: </ を \u003c/ にして script タグを閉じないようにする
-    fort_json = json.dumps(points, ensure_ascii=False).replace("</", "\\u003c/")
-    view_json = json.dumps({"xMin": x_min, "yMax": y_max, "w": w, "h": h, "gridStep": grid_step})
-    fort_status_url_js = json.dumps(FORT_STATUS_URL)
-    fort_status_url_cw_js = json.dumps(FORT_STATUS_URL_CW)
-
-    for list_mode, out_path in [
-        ("em", OUT_PATH_W1),
-        ("cw", OUT_PATH_C4),
-        ("em", OUT_PATH),
-    ]:
-        html = _build_map_html(
-            list_mode=list_mode,
-            fort_json=fort_json,
-            view_json=view_json,
-            w=w, h=h,
-            fort_status_url_js=fort_status_url_js,
-            fort_status_url_cw_js=fort_status_url_cw_js,
-        )
-        out_path.write_text(html, encoding="utf-8")
-        label = "w1" if list_mode == "em" else "c4"
-        print(f"Generated: {out_path} ({len(points)} points, {label})")
-
-
-def _build_map_html(*, list_mode, fort_json, view_json, w, h, fort_status_url_js, fort_status_url_cw_js):
-    """list_mode: 'em'=w1用, 'cw'=c4用。URL別で1リストのみ表示し、攻略状況もそのURL用のみ取得。"""
+    # 以降の点・ビットセット・検索索引はすべて読み込み順。最初の表示は全体なので、その中心からの距離で並べる
+    order = load_order(points, x_min + w / 2, y_max - h / 2)
+    points = [points[i] for i in order]
+    lists = dict.fromkeys(m for m, _ in MAP_PAGES)
+    # リストごとに点を分ける。ビットセット・検索索引・攻略状況の番号はリスト内の読み込み順
+    list_points = {m: [p for p in points if p["l"] == m] for m in lists}
+
+    view = {"xMin": x_min, "yMax": y_max, "w": w, "h": h, "gridStep": grid_step}
+    # 各ファイルは内容が変わったときだけ書き、ページからは内容のハッシュ付きURLで参照する（変わった部分だけが配信し直される）
+    # ジョブは別プロセスで動くことがあるので、関数はモジュール直下、引数は点のリストなど pickle できるものだけにする
+    jobs = [
+        ("map_app.css", partial(write_public, base_dir, "map_app.css", MAP_APP_CSS), ()),
+        ("map_app.js", partial(write_app_js, base_dir), ()),
+    ]
+    for m in lists:
+        lp = list_points[m]
+        jobs.append((f"forts_{m}", partial(write_data, base_dir, f"forts_{m}", build_forts_data, lp, view), ()))
+        jobs.append((f"fort_chunks_{m}", partial(write_fort_chunks, base_dir, m, lp), ()))
+        jobs.append((f"search_{m}", partial(write_data, base_dir, f"search_{m}", build_search_index, lp, m), ()))
+        jobs.append((f"status_{m}", partial(write_data, base_dir, f"status_{m}", build_status_data, lp, m, load_status_map(m, base_dir)), ()))
+    for m, out_name in MAP_PAGES:
+        deps = ("map_app.css", "map_app.js", f"forts_{m}", f"fort_chunks_{m}", f"search_{m}", f"status_{m}")
+        jobs.append((out_name, partial(write_map_page, base_dir, m, out_name, w, h), deps))
+    try:
+        results = run_jobs(jobs, pool=shared_pool() if len(points) >= PARALLEL_MIN_POINTS else None)
+    except BuildError as e:
+        raise SystemExit(f"マップ出力に失敗しました:\n{e}")
+    for name, _, _ in jobs:
+        url, changed = results[name]
+        print(f"{'Generated' if changed else 'Unchanged'}: {base_dir / url.partition('?')[0]}")
+    for name in OBSOLETE_DATA_FILES:
+        if (base_dir / name).exists():
+            (base_dir / name).unlink()
+            print(f"Removed: {base_dir / name}")
+    print(f"Service Worker: {write_service_worker(base_dir)} ({len(points)} points)")
+
+
+def build_forts_data(points, view) -> dict:
+    """map_data/forts_<リスト>.js の中身: 表示範囲と、そのリストの FORT_DATA の並び順のビットセット。攻略状況は status_*.js の側。
+
+    ビットセットは地図にある絞り込み（★）の分だけ。地域の絞り込みは一覧ページだけにある。
+    """
+    return {
+        "view": view,
+        "filter": build_bitsets({"star": [p["st"] for p in points]}, len(points)),
+    }
+
+
+def build_status_data(points, list_mode, status_map) -> dict:
+    """ヒートマップと同梱攻略状況のビットセット（ページで取得後に作り直す）。攻略状況だけが変わったときはこれだけ書き換わる。"""
+    sets = build_bitsets({"status": [fort_status(p, status_map) or "" for p in points]}, len(points))["sets"]["status"]
+    sets.pop("", None)
+    return {"heat": build_heat_tiles(points, list_mode, status_map), "sets": sets}
+
+
+def write_data(base_dir, name, build, *args):
+    """build(*args) を MAP_DATA に入れる map_data/<name>.js を書く。キーは name の「_」より前（search_em → search）。"""
+    return write_public(base_dir, f"map_data/{name}.js", data_script(name.partition("_")[0], build(*args)))
+
+
+def write_app_js(base_dir):
+    return write_public(base_dir, "map_app.js", map_app_js())
+
+
+def write_fort_chunks(base_dir, list_mode, points):
+    return write_public(base_dir, f"map_data/fort_chunks_{list_mode}.js", fort_chunks_script(points))
+
+
+def write_map_page(base_dir, list_mode, out_name, w, h, css, app, forts, chunks, search, status):
+    """座標マップの殻HTMLを書く。css〜status は依存ジョブの結果（ハッシュ付きURL, 書いたかどうか）。"""
+    config = {
+        "list": list_mode,
+        "statusUrl": FORT_STATUS_URL if list_mode == "em" else FORT_STATUS_URL_CW,
+        "statusFiles": status_files(list_mode),
+        "fortChunks": chunks[0],
+        "search": search[0],
+    }
+    html = _build_map_html(
+        list_mode=list_mode,
+        config_json=json.dumps(config, ensure_ascii=False).replace("</", "\\u003c/"),
+        css_url=css[0],
+        preload_url=chunks[0],
+        script_urls=[forts[0], status[0], app[0]],
+        w=w, h=h,
+    )
+    return write_public(base_dir, out_name, html)
+
+
+def data_script(key, obj) -> str:
+    """obj を MAP_DATA[key] に入れるスクリプト。<script src> で読むので file:// で開いても使える。"""
+    return f"(window.MAP_DATA = window.MAP_DATA || {{}}).{key} = {json.dumps(obj, ensure_ascii=False, separators=(',', ':'))};\n"
+
+
+def write_public(base_dir, name, text):
+    """base_dir/name に text を書き出す（内容が同じなら書かない）。→ (内容のハッシュ付きURL, 書いたかどうか)。"""
+    data = text.encode("utf-8")
+    path = base_dir / name
+    changed = not path.exists() or path.read_bytes() != data
+    if changed:
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(data)
+    return versioned_url(name, data), changed
+
+
+def _build_map_html(*, list_mode, config_json, css_url, preload_url, script_urls, w, h):
+    """list_mode: 'em'=w1用, 'cw'=c4用。URL別で1リストのみ表示し、攻略状況もそのURL用のみ取得。
+
+    殻だけを返す。描画処理は map_app.js、データは map_data/*.js（いずれも内容のハッシュ付きURL）。
+    砦の点（preload_url）は map_app.js が流し読みするので、他のスクリプトを待たずに取得を始めさせる。
+    検索索引は最初の描画に要らないので、ここでは読まず map_app.js が検索欄を初めて使うときに読む。
+    """
     is_em = list_mode == "em"
     page_title = "遠征計画 座標マップ（w1）" if is_em else "遠征計画 座標マップ（c4）"
-    list_filter_js = "'em'" if is_em else "'cw'"
     nav_other = '<a href="遠征計画_座標マップ_c4.html">座標マップ（c4）</a>' if is_em else '<a href="遠征計画_座標マップ_w1.html">座標マップ（w1）</a>'
-    toggle_html = ""  # URL別なのでトグルなし
-    if is_em:
-        fetch_js = r"""
-  var urlEm = fortStatusUrl || 'fort_status.json';
-  fetch(urlEm).then(function(r) { return r.ok ? r.json() : {}; }).catch(function() { return {}; }).then(function(o) {
-    statusMap_em = o || {};
-    draw();
-  });"""
-    else:
-        fetch_js = r"""
-  var urlCw = (fortStatusUrlCw && fortStatusUrlCw !== '') ? fortStatusUrlCw : 'fort_status_c4.json';
-  fetch(urlCw).then(function(r) { return r.ok ? r.json() : {}; }).catch(function() { return {}; }).then(function(o) {
-    statusMap_cw = o || {};
-    draw();
-  });"""
-    list_switch_script = ""  # トグルなしなので不要
+    scripts = "\n".join(f'<script src="{url}"></script>' for url in script_urls)
 
     return f"""<!DOCTYPE html>
 <html lang="ja">
@@ -111,91 +300,349 @@ def _build_map_html(*, list_mode, fort_json, view_json, w, h, fort_status_url_js
 <meta charset="UTF-8">
 <meta name="viewport" content="width=device-width, initial-scale=1">
 <title>{page_title}</title>
-<style>
-* {{ box-sizing: border-box; }}
-body {{ font-family: "Meiryo","Yu Gothic",sans-serif; margin: 12px; background: #1a1a2e; color: #eee; }}
-h1 {{ font-size: 1.1rem; margin-bottom: 6px; color: #e0e0e0; }}
-.map-toolbar {{ display: flex; align-items: center; gap: 10px; margin-bottom: 8px; flex-wrap: wrap; }}
-.map-toolbar .zoom-btn {{ width: 32px; height: 28px; border: 1px solid #555; border-radius: 4px; background: #2a2a3e; color: #ccc; font-size: 18px; cursor: pointer; line-height: 1; }}
-.map-toolbar .zoom-btn:hover {{ background: #353550; color: #fff; }}
-.map-toolbar .zoom-label {{ font-size: 12px; color: #888; min-width: 4em; }}
-.map-wrap {{ background: #3d2914; border: 1px solid #5c4a2a; border-radius: 8px; padding: 12px; overflow: hidden; width: 100%; aspect-ratio: {w} / {h}; box-sizing: border-box; position: relative; cursor: grab; touch-action: none; }}
-.map-wrap:active {{ cursor: grabbing; }}
-.map-wrap canvas {{ display: block; background: #4a3520; }}
-.tip {{ position: fixed; background: #252530; border: 1px solid #444; padding: 6px 10px; border-radius: 4px; font-size: 12px; max-width: 280px; z-index: 10; pointer-events: none; display: none; }}
-.tip .auto-link-hint {{ color: #8ecc6e; font-size: 11px; margin-top: 4px; }}
-.note {{ margin-top: 8px; font-size: 11px; color: #888; }}
-.nav-links {{ margin-bottom: 6px; font-size: 13px; }}
-.nav-links a {{ color: #6eb5ff; }}
-</style>
+<link rel="stylesheet" href="{css_url}">
+<link rel="preload" href="{preload_url}" as="fetch" crossorigin>
 </head>
 <body>
 <h1>{page_title}</h1>
 <p class="nav-links"><a href="遠征計画_座標別一覧.html">座標別一覧</a> ｜ {nav_other}</p>
-<p>座標別に砦を配置。★で等級表示。ドラッグ・ホイール拡大縮小。砦は左クリック：自動出兵　右クリック：MAP表示。</p>
-{toggle_html}
+<p>座標別に砦を配置。★で等級表示。ドラッグ・ホイール拡大縮小。砦名・座標で検索してジャンプ。砦は左クリック：自動出兵　右クリック：MAP表示。</p>
 <div class="map-toolbar">
   <button type="button" class="zoom-btn" id="zoomOut" title="縮小">−</button>
   <span class="zoom-label" id="zoomLabel">100%</span>
   <button type="button" class="zoom-btn" id="zoomIn" title="拡大">＋</button>
+  <span class="zoom-label" id="loadLabel"></span>
+  <select class="filter-select" id="starMin" title="★で絞り込み">
+    <option value="1">★すべて</option>
+    <option value="3">★3以上</option>
+    <option value="5">★5以上</option>
+    <option value="7">★7以上</option>
+  </select>
+  <select class="filter-select" id="statusFilter" title="攻略状況で絞り込み">
+    <option value="">攻略状況すべて</option>
+    <option value="open">未攻略のみ</option>
+    <option value="done">攻略済・失のみ</option>
+  </select>
+  <span class="search-box">
+    <input type="search" id="fortSearch" placeholder="砦名 / x,y / x,y 半径" autocomplete="off">
+    <ul class="search-results" id="searchResults"></ul>
+  </span>
 </div>
-<div class="map-wrap" id="mapWrap">
+<div class="map-wrap" id="mapWrap" style="aspect-ratio: {w} / {h};">
   <canvas id="can"></canvas>
 </div>
 <div id="tip" class="tip"></div>
-<div class="note">※ PC: 左クリックで自動出兵・右クリックでMAP表示。ドラッグで移動・ホイールで拡大縮小。スマホ: ドラッグで移動・ピンチで拡大縮小・タップで自動出兵を開く。＋/−ボタンでも拡大縮小可。Y軸は北が上。</div>
-<script id="fortData" type="application/json">{fort_json}</script>
-<script id="viewData" type="application/json">{view_json}</script>
-<script>
-(function(){{
-  var FORT_DATA = JSON.parse(document.getElementById('fortData').textContent);
-  var VIEW = JSON.parse(document.getElementById('viewData').textContent);
+<div class="note">※ PC: 左クリックで自動出兵・右クリックでMAP表示。ドラッグで移動・ホイールで拡大縮小。スマホ: ドラッグで移動・ピンチで拡大縮小・タップで自動出兵を開く。＋/−ボタンでも拡大縮小可。Y軸は北が上。砦が密集して見える縮尺では、絞り込みに合う砦の密度を色で表示（赤いほど未攻略が多い。タップ・クリックで近くの砦を選べる）。</div>
+<script id="mapConfig" type="application/json">{config_json}</script>
+{scripts}
+</body>
+</html>
+"""
+
+
+# 全ページ共通の見た目と描画処理。map_app.css / map_app.js（map_app_js()）として書き出し、内容が変わったときだけURLのハッシュが変わる
+MAP_APP_CSS = """* { box-sizing: border-box; }
+body { font-family: "Meiryo","Yu Gothic",sans-serif; margin: 12px; background: #1a1a2e; color: #eee; }
+h1 { font-size: 1.1rem; margin-bottom: 6px; color: #e0e0e0; }
+.map-toolbar { display: flex; align-items: center; gap: 10px; margin-bottom: 8px; flex-wrap: wrap; }
+.map-toolbar .zoom-btn { width: 32px; height: 28px; border: 1px solid #555; border-radius: 4px; background: #2a2a3e; color: #ccc; font-size: 18px; cursor: pointer; line-height: 1; }
+.map-toolbar .zoom-btn:hover { background: #353550; color: #fff; }
+.map-toolbar .zoom-label { font-size: 12px; color: #888; min-width: 4em; }
+.map-toolbar .search-box { position: relative; }
+.map-toolbar .search-box input { height: 28px; width: 14em; border: 1px solid #555; border-radius: 4px; background: #2a2a3e; color: #eee; font-size: 12px; padding: 0 6px; }
+.search-results { display: none; position: absolute; top: 30px; left: 0; z-index: 20; min-width: 100%; max-height: 320px; overflow-y: auto; margin: 0; padding: 0; list-style: none; background: #252530; border: 1px solid #444; border-radius: 4px; }
+.search-results li { padding: 4px 8px; font-size: 12px; white-space: nowrap; cursor: pointer; }
+.search-results li:hover { background: #353550; }
+.map-toolbar .filter-select { height: 28px; border: 1px solid #555; border-radius: 4px; background: #2a2a3e; color: #ccc; font-size: 12px; }
+.map-wrap { background: #3d2914; border: 1px solid #5c4a2a; border-radius: 8px; padding: 12px; overflow: hidden; width: 100%; box-sizing: border-box; position: relative; cursor: grab; touch-action: none; }
+.map-wrap:active { cursor: grabbing; }
+.map-wrap canvas { display: block; background: #4a3520; }
+.tip { position: fixed; background: #252530; border: 1px solid #444; padding: 6px 10px; border-radius: 4px; font-size: 12px; max-width: 280px; z-index: 10; pointer-events: none; display: none; }
+.tip .auto-link-hint { color: #8ecc6e; font-size: 11px; margin-top: 4px; }
+.note { margin-top: 8px; font-size: 11px; color: #888; }
+.nav-links { margin-bottom: 6px; font-size: 13px; }
+.nav-links a { color: #6eb5ff; }
+"""
+
+_MAP_APP_JS = r"""/* 自動生成: gen_map_from_csv.py。手で編集しない */
+(function(){
+  /* ページごとの設定は殻HTMLの mapConfig、データは先に読み込んだ map_data/*.js が MAP_DATA に入れたもの */
+  var CONFIG = JSON.parse(document.getElementById('mapConfig').textContent);
+  var DATA = window.MAP_DATA;
+  /* このページのリストの砦の点。読み込み順（★が高い → 全体表示の中心に近い）で、チャンクが届くたびに後ろへ足すので、まだ届いていない添字は undefined */
+  var FORT_DATA = [];
+  var VIEW = DATA.forts.view;
+  var HEAT = DATA.status.heat;
+  var FILTER = DATA.forts.filter;
+  FILTER.sets.status = DATA.status.sets;
+  var SEARCH = null;  /* 検索索引（MAP_DATA.search）。検索欄を初めて使うときに読む */
   var xMin = VIEW.xMin, yMax = VIEW.yMax, w = VIEW.w, h = VIEW.h, gridStep = VIEW.gridStep;
+  var heatLevels = [];  /* 展開済みのヒートマップ段（粗い順）。展開前・非対応時は空で、砦を1件ずつ描く */
 
   var el = document.getElementById('can');
   var wrap = document.getElementById('mapWrap');
   var tip = document.getElementById('tip');
   var zoomLabel = document.getElementById('zoomLabel');
+  var loadLabel = document.getElementById('loadLabel');
   var ctx = el.getContext('2d');
 
   var scale = 1, panX = 0, panY = 0;
-  var drag = {{ on: false, startX: 0, startY: 0, startPanX: 0, startPanY: 0 }};
-  var pinch = {{ on: false, startDist: 0, startScale: 0, startPanX: 0, startPanY: 0, centerMapX: 0, centerMapY: 0 }};
-  var listFilter = {list_filter_js};
+  var drag = { on: false, startX: 0, startY: 0, startPanX: 0, startPanY: 0 };
+  var pinch = { on: false, startDist: 0, startScale: 0, startPanX: 0, startPanY: 0, centerMapX: 0, centerMapY: 0 };
+  var listFilter = CONFIG.list;
   var hoverPt = null;
-  var statusMap_em = {{}}, statusMap_cw = {{}};
-  var fortStatusUrl = {fort_status_url_js};
-  var fortStatusUrlCw = {fort_status_url_cw_js};{fetch_js}
+  var statusMap = {};
+/*BITSET_JS*/
+  /* 絞り込み: ★はビルド時のビットセット、攻略状況は同梱分で始めて取得後に1回だけ作り直す（点はこのページのリストの分だけ） */
+  var nPts = FILTER.n, noneSet = Bits.words(nPts), decodedSets = {};
+  var starMinSel = document.getElementById('starMin'), statusSel = document.getElementById('statusFilter');
+  function bitset(facet, value) {
+    var k = facet + ':' + value;
+    if (!decodedSets[k]) {
+      var b64 = (FILTER.sets[facet] || {})[value];
+      decodedSets[k] = b64 == null ? noneSet : Bits.decode(b64, nPts);
+    }
+    return decodedSets[k];
+  }
+  function isDone(st) { return st === '攻略済' || st === '失'; }
+  function statusOf(p) {
+    return listFilter === 'cw' ? (statusMap[p.x + ',' + p.y] || statusMap[p.n]) : statusMap[p.n];
+  }
+  var doneSet = Bits.words(nPts);
+  Object.keys(FILTER.sets.status || {}).forEach(function(st) { if (isDone(st)) Bits.or(doneSet, bitset('status', st)); });
+  /* ビルド時の攻略済（ヒートマップの集計に使った状況）。取得後の doneSet との差をヒートマップに足し引きする */
+  var bundledDone = Bits.or(Bits.words(nPts), doneSet), statusVersion = 0;
+  var visible = noneSet, visibleCount = 0;
+  function computeVisible() {
+    var v = Bits.all(nPts);
+    var minStar = parseInt(starMinSel.value, 10) || 1;
+    if (minStar > 1) {
+      var stars = Bits.words(nPts);
+      Object.keys(FILTER.sets.star || {}).forEach(function(lv) { if (parseInt(lv, 10) >= minStar) Bits.or(stars, bitset('star', lv)); });
+      Bits.and(v, stars);
+    }
+    if (statusSel.value === 'open') Bits.andNot(v, doneSet);
+    else if (statusSel.value === 'done') Bits.and(v, doneSet);
+    visible = v;
+    visibleCount = Bits.count(v);
+  }
+  function updateVisible() {
+    computeVisible();
+    draw();
+  }
+  /* 取得した攻略状況で doneSet の [from, to) 行を作り直す。まだ届いていない行は同梱分のままにし、届いたときに作り直す */
+  var statusFetched = false;
+  function markStatus(from, to) {
+    for (var i = from; i < to; i++) {
+      if (isDone(statusOf(FORT_DATA[i]))) doneSet[i >>> 5] |= 1 << (i & 31);
+      else doneSet[i >>> 5] &= ~(1 << (i & 31));
+    }
+  }
+  function refreshStatusSet() {
+    statusFetched = true;
+    statusVersion++;
+    markStatus(0, FORT_DATA.length);
+    updateVisible();
+  }
+  starMinSel.addEventListener('change', updateVisible);
+  statusSel.addEventListener('change', updateVisible);
+  computeVisible();
 
-  function toScreen(mx, my) {{
+  /* 攻略状況: 語彙表形式（v/k/c）なら {キー: 状況} に戻す。APIや従来JSONの平らな辞書はそのまま */
+  function decodeStatus(o) {
+    if (!o || !o.v || !o.k || typeof o.c !== 'string') return o || {};
+    var m = {};
+    for (var i = 0; i < o.k.length; i++) m[o.k[i]] = o.v[parseInt(o.c.charAt(i), 36)];
+    return m;
+  }
+  function fetchStatus(urls) {
+    var url = urls.shift();
+    return fetch(url).then(function(r) { if (!r.ok) throw new Error(r.status); return r.json(); }).then(decodeStatus)
+      .catch(function() { return urls.length ? fetchStatus(urls) : {}; });
+  }
+  /* API（設定時）→ 同梱の event 切り出し → 従来の単独JSON の順に、取れたものを使う */
+  fetchStatus((CONFIG.statusUrl ? [CONFIG.statusUrl] : []).concat(CONFIG.statusFiles)).then(function(o) {
+    statusMap = o;
+    refreshStatusSet();
+  });
+
+  /* 砦の点: 1行1チャンク（MAP_DATA_CHUNK([...]);）のファイルを fetch で流し読みし、行が揃うたびに足して描く。
+     file:// など流し読みできないときや途中で切れたときは同じファイルを <script src> で読む（行ごとに MAP_DATA_CHUNK が呼ばれる） */
+  var CHUNK_HEAD = 'MAP_DATA_CHUNK(', CHUNK_TAIL = ');', drawQueued = false, chunksAdded = 0;
+  function addForts(points) {
+    var from = FORT_DATA.length;
+    chunksAdded++;
+    for (var i = 0; i < points.length; i++) FORT_DATA.push(points[i]);
+    if (statusFetched) {
+      markStatus(from, FORT_DATA.length);
+      statusVersion++;
+      computeVisible();
+    }
+    loadLabel.textContent = FORT_DATA.length < nPts ? '読込中 ' + Math.floor(FORT_DATA.length * 100 / nPts) + '%' : '';
+    if (document.activeElement === searchBox) renderSearch();
+    /* 続けて届いたチャンクは次の描画1回にまとめる */
+    if (drawQueued) return;
+    drawQueued = true;
+    requestAnimationFrame(function() { drawQueued = false; draw(); });
+  }
+  function addChunkLine(line) {
+    if (line.indexOf(CHUNK_HEAD) === 0) addForts(JSON.parse(line.slice(CHUNK_HEAD.length, line.length - CHUNK_TAIL.length)));
+  }
+  function loadFortsByScript(url) {
+    /* 流し読みで足し終えたチャンクは飛ばし、残りだけ足す */
+    var skip = chunksAdded;
+    window.MAP_DATA_CHUNK = function(points) {
+      if (skip > 0) skip--;
+      else addForts(points);
+    };
+    var s = document.createElement('script');
+    s.src = url;
+    s.onerror = function() { loadLabel.textContent = '読込失敗'; };
+    document.body.appendChild(s);
+  }
+  function loadForts(url) {
+    if (location.protocol === 'file:' || !window.fetch || !window.TextDecoder || typeof ReadableStream === 'undefined') {
+      loadFortsByScript(url);
+      return;
+    }
+    fetch(url).then(function(r) {
+      if (!r.ok || !r.body) throw new Error(r.status);
+      var reader = r.body.getReader(), decoder = new TextDecoder(), rest = '';
+      function pump() {
+        return reader.read().then(function(res) {
+          var text = rest + (res.done ? decoder.decode() : decoder.decode(res.value, { stream: true }));
+          var lines = text.split('\n');
+          rest = res.done ? '' : lines.pop();
+          lines.forEach(addChunkLine);
+          return res.done ? null : pump();
+        });
+      }
+      return pump();
+    }).catch(function() { loadFortsByScript(url); });
+  }
+
+  function toScreen(mx, my) {
     var totalScale = baseScale * scale;
-    return {{
+    return {
       x: (mx - xMin) * totalScale + panX,
       y: (yMax - my) * totalScale + panY
-    }};
-  }}
-  function toMap(sx, sy) {{
+    };
+  }
+  function toMap(sx, sy) {
     var totalScale = baseScale * scale;
-    return {{
+    return {
       x: (sx - panX) / totalScale + xMin,
       y: yMax - (sy - panY) / totalScale
-    }};
-  }}
+    };
+  }
+
+  /* ヒートマップ: 段ごとに zlib 展開 → ImageData で1枚の小さな canvas にし、描画時は drawImage 1回 */
+  function inflateHeat() {
+    if (typeof DecompressionStream === 'undefined') return;
+    Promise.all(HEAT.levels.map(function(lv) {
+      var bin = atob(lv.z), u8 = new Uint8Array(bin.length);
+      for (var i = 0; i < bin.length; i++) u8[i] = bin.charCodeAt(i);
+      var stream = new Blob([u8]).stream().pipeThrough(new DecompressionStream('deflate'));
+      return new Response(stream).arrayBuffer().then(function(buf) {
+        return { cell: lv.cell, n: lv.n, counts: new Uint8Array(buf), canvas: null };
+      });
+    })).then(function(levels) { heatLevels = levels; draw(); }).catch(function() {});
+  }
+  /* 絞り込みに合う砦が画面上で密に並ぶ（1件あたり HEAT.pxPerFort px² 未満）ときはヒートマップ */
+  function heatActive(totalScale) {
+    return heatLevels.length > 0 && w * h * totalScale * totalScale < visibleCount * HEAT.pxPerFort;
+  }
+  function heatLevelFor(totalScale) {
+    /* セルが画面上で 3px 以上になる最も細かい段。どれも満たさなければ最も粗い段 */
+    for (var i = heatLevels.length - 1; i > 0; i--) {
+      if (heatLevels[i].cell * totalScale >= 3) return heatLevels[i];
+    }
+    return heatLevels[0];
+  }
+  /* レイヤー（「★帯:状態」）が今の絞り込みに入るか。★帯は下限が「★n以上」以上のもの */
+  function heatLayerOn(key) {
+    var parts = key.split(':');
+    if (parseInt(parts[0], 10) < (parseInt(starMinSel.value, 10) || 1)) return false;
+    return !statusSel.value || statusSel.value === parts[1];
+  }
+  /* ★レベル → ヒートマップの★帯（ビルド側の star_band と同じ。下限が st 以下の最後の帯、無ければ先頭） */
+  function heatBand(st) {
+    var band = null;
+    HEAT.layers.forEach(function(key) {
+      var b = key.split(':')[0];
+      if (band === null || parseInt(b, 10) <= st) band = b;
+    });
+    return band;
+  }
+  /* 絞り込みに入るレイヤーだけを未攻略・攻略済に分けて足し、段ごとの小さな canvas にする。
+     取得した攻略状況がビルド時と違う砦は、その帯の未攻略⇔攻略済の間で移す（絞り込み・攻略状況が変わったら作り直す） */
+  function heatCanvas(lv) {
+    var filterKey = starMinSel.value + ':' + statusSel.value + ':' + statusVersion;
+    if (lv.canvas && lv.filterKey === filterKey) return lv.canvas;
+    var n = lv.n, size = n * n;
+    var open = new Uint16Array(size), done = new Uint16Array(size), maxOpen = 1, maxDone = 1, i, k;
+    HEAT.layers.forEach(function(key, li) {
+      if (!heatLayerOn(key)) return;
+      var dst = /:done$/.test(key) ? done : open;
+      for (var j = 0, off = li * size; j < size; j++) dst[j] += lv.counts[off + j];
+    });
+    Bits.forEachChanged(bundledDone, doneSet, function(i, nowDone) {
+      var p = FORT_DATA[i];
+      if (!p || p.x < HEAT.x0 || p.x > -HEAT.x0 || p.y > HEAT.y0 || p.y < -HEAT.y0) return;
+      var band = heatBand(p.st || 1);
+      var cell = Math.floor((HEAT.y0 - p.y) / lv.cell) * n + Math.floor((p.x - HEAT.x0) / lv.cell);
+      var src = nowDone ? open : done, dst = nowDone ? done : open;
+      /* ビルド時のセル値は 255 で頭打ちなので、0 未満にはしない */
+      if (heatLayerOn(band + (nowDone ? ':open' : ':done')) && src[cell]) src[cell]--;
+      if (heatLayerOn(band + (nowDone ? ':done' : ':open'))) dst[cell]++;
+    });
+    for (i = 0; i < size; i++) {
+      if (open[i] > maxOpen) maxOpen = open[i];
+      if (done[i] > maxDone) maxDone = done[i];
+    }
+    var c = document.createElement('canvas');
+    c.width = n;
+    c.height = n;
+    var cctx = c.getContext('2d');
+    var img = cctx.createImageData(n, n), px = img.data;
+    for (i = 0; i < size; i++) {
+      k = i * 4;
+      if (open[i]) {
+        /* 未攻略が多いほど赤く濃く */
+        var t = Math.sqrt(open[i] / maxOpen);
+        px[k] = 255; px[k + 1] = Math.round(220 * (1 - t)); px[k + 2] = 40; px[k + 3] = Math.round(90 + 165 * t);
+      } else if (done[i]) {
+        /* 攻略済・失だけのセルは灰色（「攻略済・失のみ」のときは多いほど濃く） */
+        px[k] = 160; px[k + 1] = 160; px[k + 2] = 160; px[k + 3] = Math.round(50 + 120 * Math.sqrt(done[i] / maxDone));
+      }
+    }
+    cctx.putImageData(img, 0, 0);
+    lv.canvas = c;
+    lv.filterKey = filterKey;
+    return c;
+  }
+  function drawHeat(totalScale) {
+    var lv = heatLevelFor(totalScale);
+    var s = toScreen(HEAT.x0, HEAT.y0);
+    var size = lv.n * lv.cell * totalScale;
+    ctx.imageSmoothingEnabled = false;
+    ctx.drawImage(heatCanvas(lv), s.x, s.y, size, size);
+  }
 
   var baseScale = 1;
-  function resize() {{
+  function resize() {
     var r = wrap.getBoundingClientRect();
     var cw = r.width, ch = r.height;
-    if (el.width !== cw || el.height !== ch) {{
+    if (el.width !== cw || el.height !== ch) {
       el.width = cw;
       el.height = ch;
       baseScale = Math.min(cw / w, ch / h);
       zoomLabel.textContent = Math.round(scale * 100) + '%';
       draw();
-    }}
-  }}
+    }
+  }
 
-  function draw() {{
+  function draw() {
     var cw = el.width, ch = el.height;
     if (cw === 0 || ch === 0) return;
     var totalScale = baseScale * scale;
@@ -210,104 +657,162 @@ h1 {{ font-size: 1.1rem; margin-bottom: 6px; color: #e0e0e0; }}
     ctx.strokeStyle = '#6b5344';
     ctx.lineWidth = 0.5;
     var gs = gridStep;
-    for (var xi = Math.floor(visX1 / gs) * gs; xi <= visX2 + gs; xi += gs) {{
+    for (var xi = Math.floor(visX1 / gs) * gs; xi <= visX2 + gs; xi += gs) {
       if (xi < xMin || xi > xMin + w) continue;
       var s = toScreen(xi, 0);
       ctx.beginPath();
       ctx.moveTo(s.x, 0);
       ctx.lineTo(s.x, ch);
       ctx.stroke();
-    }}
-    for (var yi = Math.floor(visY1 / gs) * gs; yi <= visY2 + gs; yi += gs) {{
+    }
+    for (var yi = Math.floor(visY1 / gs) * gs; yi <= visY2 + gs; yi += gs) {
       if (yi < yMax - h || yi > yMax) continue;
       var s = toScreen(0, yi);
       ctx.beginPath();
       ctx.moveTo(0, s.y);
       ctx.lineTo(cw, s.y);
       ctx.stroke();
-    }}
+    }
+
+    if (heatActive(totalScale)) {
+      drawHeat(totalScale);
+      /* 選んでいる砦（マウスを乗せた・検索で飛んだ）だけはヒートマップの上に描く */
+      if (hoverPt) drawFort(hoverPt, totalScale, false);
+      return;
+    }
 
     var drawStar = totalScale > 0.3;
-    for (var i = 0; i < FORT_DATA.length; i++) {{
-      ctx.globalAlpha = 1;
+    Bits.forEach(visible, function(i) {
       var p = FORT_DATA[i];
-      if (p.l !== listFilter) continue;
-      if (p.x < visX1 - 50 || p.x > visX2 + 50 || p.y < visY1 - 50 || p.y > visY2 + 50) continue;
-      var s = toScreen(p.x, p.y);
-      var r = 3 + Math.min(Math.max(p.st || 1, 5), 9);  /* ★5以下は★5と同じサイズ */
-      var rad = r * totalScale;
-      if (rad < 0.5) continue;
-      var statusMap = listFilter === 'em' ? statusMap_em : statusMap_cw;
-      var st = listFilter === 'cw' ? (statusMap[p.x + ',' + p.y] || statusMap[p.n]) : statusMap[p.n];
-      if (st === '攻略済' || st === '失') ctx.globalAlpha = 0.4;
-      ctx.fillStyle = p.l === 'cw' ? '#2d4a6e' : '#2d5a2d';
-      ctx.strokeStyle = p.l === 'cw' ? '#5a8acc' : '#5acc5a';
-      ctx.lineWidth = hoverPt === p ? 2 : 1;
-      ctx.beginPath();
-      ctx.arc(s.x, s.y, Math.max(2, rad), 0, Math.PI * 2);
-      ctx.fill();
-      ctx.stroke();
-      if (drawStar && rad >= 6) {{
-        ctx.fillStyle = '#fff';
-        ctx.font = 'bold ' + Math.max(8, Math.min(12, rad)) + 'px sans-serif';
-        ctx.textAlign = 'center';
-        ctx.textBaseline = 'middle';
-        ctx.fillText(p.s || '', s.x, s.y);
-      }}
-      ctx.globalAlpha = 1;
-    }}
-  }}
-
-  function hitTest(sx, sy) {{
+      if (!p) return;
+      if (p.x < visX1 - 50 || p.x > visX2 + 50 || p.y < visY1 - 50 || p.y > visY2 + 50) return;
+      drawFort(p, totalScale, drawStar);
+    });
+  }
+  function drawFort(p, totalScale, drawStar) {
+    ctx.globalAlpha = 1;
+    var s = toScreen(p.x, p.y);
+    var r = 3 + Math.min(Math.max(p.st || 1, 5), 9);  /* ★5以下は★5と同じサイズ */
+    var rad = r * totalScale;
+    if (rad < 0.5) return;
+    if (isDone(statusOf(p))) ctx.globalAlpha = 0.4;
+    ctx.fillStyle = p.l === 'cw' ? '#2d4a6e' : '#2d5a2d';
+    ctx.strokeStyle = p.l === 'cw' ? '#5a8acc' : '#5acc5a';
+    ctx.lineWidth = hoverPt === p ? 2 : 1;
+    ctx.beginPath();
+    ctx.arc(s.x, s.y, Math.max(2, rad), 0, Math.PI * 2);
+    ctx.fill();
+    ctx.stroke();
+    if (drawStar && rad >= 6) {
+      ctx.fillStyle = '#fff';
+      ctx.font = 'bold ' + Math.max(8, Math.min(12, rad)) + 'px sans-serif';
+      ctx.textAlign = 'center';
+      ctx.textBaseline = 'middle';
+      ctx.fillText(p.s || '', s.x, s.y);
+    }
+    ctx.globalAlpha = 1;
+  }
+
+  function hitTest(sx, sy) {
     var m = toMap(sx, sy);
     var totalScale = baseScale * scale;
+    var heat = heatActive(totalScale);
     var best = null, bestD = 999999;
-    for (var i = 0; i < FORT_DATA.length; i++) {{
+    Bits.forEach(visible, function(i) {
       var p = FORT_DATA[i];
-      if (p.l !== listFilter) continue;
+      if (!p) return;
       var r = 3 + Math.min(Math.max(p.st || 1, 5), 9);  /* ★5以下は★5と同じサイズ */
-      var thresh = (r + 4) * totalScale;
+      /* ヒートマップ表示中は点が見えないので、画面上 HEAT.hitPx 以内で最も近い砦 */
+      var thresh = heat ? HEAT.hitPx / totalScale : (r + 4) * totalScale;
       var dx = p.x - m.x, dy = p.y - m.y;
       var d = dx * dx + dy * dy;
-      if (d < thresh * thresh && d < bestD) {{ bestD = d; best = p; }}
-    }}
+      if (d < thresh * thresh && d < bestD) { bestD = d; best = p; }
+    });
     return best;
-  }}
+  }
 
-  function zoom(delta, centerX, centerY) {{
+/*SEARCH_JS*/
+  /* 検索: 入力のたびに索引で候補を出し（表示中の絞り込みに入る、読み込み済みの砦のみ）、選ぶとその砦を中心に拡大 */
+  var searchBox = document.getElementById('fortSearch'), searchList = document.getElementById('searchResults');
+  var searchHits = [], searchLoading = false;
+  function loadSearch() {
+    if (searchLoading) return;
+    searchLoading = true;
+    var s = document.createElement('script');
+    s.src = CONFIG.search;
+    s.onload = function() {
+      SEARCH = window.MAP_DATA.search;
+      if (document.activeElement === searchBox) renderSearch();
+    };
+    s.onerror = function() { searchLoading = false; };
+    document.body.appendChild(s);
+  }
+  function renderSearch() {
+    if (!SEARCH) {
+      loadSearch();
+      return;
+    }
+    searchHits = Search.query(searchBox.value, function(i) { return Bits.has(visible, i) && FORT_DATA[i]; }, 20);
+    searchList.innerHTML = '';
+    searchHits.forEach(function(i) {
+      var p = FORT_DATA[i], li = document.createElement('li');
+      li.textContent = p.n + ' (' + p.x + ',' + p.y + ') ' + (p.s || '');
+      li.addEventListener('mousedown', function(e) { e.preventDefault(); jumpTo(p); });
+      searchList.appendChild(li);
+    });
+    searchList.style.display = searchHits.length ? 'block' : 'none';
+  }
+  function jumpTo(p) {
+    scale = Math.max(scale, 4);
+    panX = el.width / 2 - (p.x - xMin) * baseScale * scale;
+    panY = el.height / 2 - (yMax - p.y) * baseScale * scale;
+    hoverPt = p;
+    zoomLabel.textContent = Math.round(scale * 100) + '%';
+    searchList.style.display = 'none';
+    draw();
+  }
+  searchBox.addEventListener('input', renderSearch);
+  searchBox.addEventListener('focus', renderSearch);
+  searchBox.addEventListener('blur', function() { searchList.style.display = 'none'; });
+  searchBox.addEventListener('keydown', function(e) {
+    if (e.key === 'Enter' && searchHits.length) { e.preventDefault(); jumpTo(FORT_DATA[searchHits[0]]); }
+    else if (e.key === 'Escape') searchList.style.display = 'none';
+  });
+
+  function zoom(delta, centerX, centerY) {
     var rect = wrap.getBoundingClientRect();
     var oldScale = scale;
     scale = Math.max(0.1, Math.min(8, scale * (delta > 0 ? 1.2 : 1/1.2)));
-    if (centerX != null && centerY != null) {{
+    if (centerX != null && centerY != null) {
       var mx = (centerX - rect.left - panX) / (baseScale * oldScale) + xMin;
       var my = yMax - (centerY - rect.top - panY) / (baseScale * oldScale);
       var s = toScreen(mx, my);
       panX = centerX - rect.left - (mx - xMin) * baseScale * scale;
       panY = centerY - rect.top - (yMax - my) * baseScale * scale;
-    }}
+    }
     zoomLabel.textContent = Math.round(scale * 100) + '%';
     draw();
-  }}
+  }
 
-  function dist(a, b) {{ return Math.sqrt((a.clientX - b.clientX) * (a.clientX - b.clientX) + (a.clientY - b.clientY) * (a.clientY - b.clientY)); }}
-  function touchCenter(touches) {{ return {{ x: (touches[0].clientX + touches[1].clientX) / 2, y: (touches[0].clientY + touches[1].clientY) / 2 }}; }}
+  function dist(a, b) { return Math.sqrt((a.clientX - b.clientX) * (a.clientX - b.clientX) + (a.clientY - b.clientY) * (a.clientY - b.clientY)); }
+  function touchCenter(touches) { return { x: (touches[0].clientX + touches[1].clientX) / 2, y: (touches[0].clientY + touches[1].clientY) / 2 }; }
 
-  wrap.addEventListener('wheel', function(e) {{ e.preventDefault(); zoom(-e.deltaY, e.clientX, e.clientY); }}, {{ passive: false }});
-  document.getElementById('zoomIn').addEventListener('click', function() {{ zoom(1); }});
-  document.getElementById('zoomOut').addEventListener('click', function() {{ zoom(-1); }});
-  document.getElementById('zoomIn').addEventListener('touchend', function(e) {{ e.preventDefault(); zoom(1); }});
-  document.getElementById('zoomOut').addEventListener('touchend', function(e) {{ e.preventDefault(); zoom(-1); }});
+  wrap.addEventListener('wheel', function(e) { e.preventDefault(); zoom(-e.deltaY, e.clientX, e.clientY); }, { passive: false });
+  document.getElementById('zoomIn').addEventListener('click', function() { zoom(1); });
+  document.getElementById('zoomOut').addEventListener('click', function() { zoom(-1); });
+  document.getElementById('zoomIn').addEventListener('touchend', function(e) { e.preventDefault(); zoom(1); });
+  document.getElementById('zoomOut').addEventListener('touchend', function(e) { e.preventDefault(); zoom(-1); });
 
-  wrap.addEventListener('mousedown', function(e) {{
+  wrap.addEventListener('mousedown', function(e) {
     if (e.button !== 0) return;
     drag.on = true;
     drag.startX = e.clientX;
     drag.startY = e.clientY;
     drag.startPanX = panX;
     drag.startPanY = panY;
-  }});
-  wrap.addEventListener('touchstart', function(e) {{
-    if (e.touches.length === 2) {{
+  });
+  wrap.addEventListener('touchstart', function(e) {
+    if (e.touches.length === 2) {
       var rect = wrap.getBoundingClientRect();
       var c = touchCenter(e.touches);
       var sx = c.x - rect.left, sy = c.y - rect.top;
@@ -319,16 +824,16 @@ h1 {{ font-size: 1.1rem; margin-bottom: 6px; color: #e0e0e0; }}
       pinch.startPanY = panY;
       pinch.centerMapX = m.x;
       pinch.centerMapY = m.y;
-    }} else if (e.touches.length === 1) {{
+    } else if (e.touches.length === 1) {
       drag.on = true;
       drag.startX = e.touches[0].clientX;
       drag.startY = e.touches[0].clientY;
       drag.startPanX = panX;
       drag.startPanY = panY;
-    }}
-  }}, {{ passive: true }});
-  wrap.addEventListener('touchmove', function(e) {{
-    if (e.touches.length === 2 && pinch.on) {{
+    }
+  }, { passive: true });
+  wrap.addEventListener('touchmove', function(e) {
+    if (e.touches.length === 2 && pinch.on) {
       e.preventDefault();
       var rect = wrap.getBoundingClientRect();
       var d = dist(e.touches[0], e.touches[1]);
@@ -340,81 +845,89 @@ h1 {{ font-size: 1.1rem; margin-bottom: 6px; color: #e0e0e0; }}
       panY = sy - s.y;
       zoomLabel.textContent = Math.round(scale * 100) + '%';
       draw();
-    }} else if (e.touches.length === 1 && drag.on) {{
+    } else if (e.touches.length === 1 && drag.on) {
       e.preventDefault();
       panX = drag.startPanX + (e.touches[0].clientX - drag.startX);
       panY = drag.startPanY + (e.touches[0].clientY - drag.startY);
       draw();
-    }}
-  }}, {{ passive: false }});
-  wrap.addEventListener('touchend', function(e) {{
-    if (e.touches.length === 0) {{
-      if (pinch.on) {{ pinch.on = false; }}
-      if (drag.on) {{
-        if (e.changedTouches && e.changedTouches[0]) {{
+    }
+  }, { passive: false });
+  wrap.addEventListener('touchend', function(e) {
+    if (e.touches.length === 0) {
+      if (pinch.on) { pinch.on = false; }
+      if (drag.on) {
+        if (e.changedTouches && e.changedTouches[0]) {
           var dx = e.changedTouches[0].clientX - drag.startX;
           var dy = e.changedTouches[0].clientY - drag.startY;
-          if (dx * dx + dy * dy < 100) {{
+          if (dx * dx + dy * dy < 100) {
             var rect = wrap.getBoundingClientRect();
             var pt = hitTest(e.changedTouches[0].clientX - rect.left, e.changedTouches[0].clientY - rect.top);
             if (pt && pt.u) window.open(pt.u, '_blank');
-          }}
-        }}
+          }
+        }
         drag.on = false;
-      }}
-    }} else if (e.touches.length === 1) {{ pinch.on = false; }}
-  }}, {{ passive: true }});
+      }
+    } else if (e.touches.length === 1) { pinch.on = false; }
+  }, { passive: true });
 
-  document.addEventListener('mousemove', function(e) {{
+  document.addEventListener('mousemove', function(e) {
     var rect = wrap.getBoundingClientRect();
     var sx = e.clientX - rect.left, sy = e.clientY - rect.top;
-    if (drag.on) {{
+    if (drag.on) {
       panX = drag.startPanX + (e.clientX - drag.startX);
       panY = drag.startPanY + (e.clientY - drag.startY);
       draw();
       return;
-    }}
+    }
     var pt = hitTest(sx, sy);
-    if (pt !== hoverPt) {{
+    if (pt !== hoverPt) {
       hoverPt = pt;
       draw();
-      if (pt) {{
+      if (pt) {
         var txt = pt.n + ' (' + pt.x + ',' + pt.y + ') ' + (pt.s || '');
-        var statusMap = listFilter === 'em' ? statusMap_em : statusMap_cw;
-        var st = listFilter === 'cw' ? (statusMap[pt.x + ',' + pt.y] || statusMap[pt.n]) : statusMap[pt.n];
+        var st = statusOf(pt);
         if (st) txt += ' [' + st + ']';
         if (pt.u || pt.m) tip.innerHTML = txt + '<div class="auto-link-hint">左クリック: 自動出兵　右クリック: MAP</div>';
         else tip.textContent = txt;
         tip.style.display = 'block';
-      }} else tip.style.display = 'none';
-    }}
-    if (tip.style.display === 'block') {{ tip.style.left = (e.clientX + 12) + 'px'; tip.style.top = (e.clientY + 8) + 'px'; }}
-  }});
-  document.addEventListener('mouseup', function() {{ drag.on = false; }});
+      } else tip.style.display = 'none';
+    }
+    if (tip.style.display === 'block') { tip.style.left = (e.clientX + 12) + 'px'; tip.style.top = (e.clientY + 8) + 'px'; }
+  });
+  document.addEventListener('mouseup', function() { drag.on = false; });
 
-  wrap.addEventListener('click', function(e) {{
+  wrap.addEventListener('click', function(e) {
     if (e.pointerType === 'touch') return;
     if (e.button !== 0) return;
     if (drag.startX !== e.clientX || drag.startY !== e.clientY) return;
     var rect = wrap.getBoundingClientRect();
     var pt = hitTest(e.clientX - rect.left, e.clientY - rect.top);
     if (pt && pt.u) window.open(pt.u, '_blank');
-  }});
-  wrap.addEventListener('contextmenu', function(e) {{
+  });
+  wrap.addEventListener('contextmenu', function(e) {
     var rect = wrap.getBoundingClientRect();
     var pt = hitTest(e.clientX - rect.left, e.clientY - rect.top);
-    if (pt && pt.m) {{ e.preventDefault(); window.open(pt.m, '_blank'); }}
-  }});
+    if (pt && pt.m) { e.preventDefault(); window.open(pt.m, '_blank'); }
+  });
 
-  {list_switch_script}
   window.addEventListener('resize', resize);
   resize();
-}})();
-</script>
-</body>
-</html>
+  loadForts(CONFIG.fortChunks);
+  inflateHeat();
+  /*SW_REGISTER_JS*/
+})();
 """
 
 
+@lru_cache(maxsize=None)
+def map_app_js() -> str:
+    """map_app.js の中身。共通部品の埋め込みは書き出すときに1回だけ行う。"""
+    return (
+        _MAP_APP_JS.replace("/*BITSET_JS*/", BITSET_JS)
+        .replace("/*SEARCH_JS*/", SEARCH_JS)
+        .replace("/*SW_REGISTER_JS*/", SW_REGISTER_JS)
+    )
+
+
 if __name__ == "__main__":
     main()
@@ -1,28 +1,49 @@
 # -*- coding: utf-8 -*-
 """
-砦攻略システム側のCSVから fort_status.json（w用）と fort_status_c4.json（c4用）を生成する。
-CSV は npc_name と strategy_status 列を含むこと。
-出力: fort_status.json … w用。fort_status_c4.json … c4用。
-マップは w リストで fort_status.json、c4 リストで fort_status_c4.json を参照する。
+砦攻略システム側のCSVから攻略状況のバンドルを生成する。
+CSV は npc_name と strategy_status 列（c4 など座標で紐付ける event は base1_x, base1_y 列も）を含むこと。
+event_id 列があれば行ごとにその event に振り分けるので、何 event 分のCSVでも1回で処理できる。
+
+出力:
+  fort_status_bundle.json … 全 event 分。
+  fort_status.<event>.json … event ごとの切り出し（マップは自分の event の分だけ取得する）。w は w1、c4 は e1。
+形式はどちらも状況の語彙表 "v" と、キー列 "k"・状況コード列 "c"（1文字 = 語彙の番号の36進）。
+  {"v": ["攻略済", "失", "未攻略"], "events": {"w1": {"key": "name", "k": ["洛陽", ...], "c": "10..."}}}
+
+使い方:
+  python make_fort_status_json.py                  … 既定の候補CSV（CSV_SOURCES）から
+  python make_fort_status_json.py a.csv w1=b.csv   … 指定CSVから（event=パス は event_id 列の無い行の event）
 """
 import csv
 import json
+import sys
+from collections import namedtuple
 from pathlib import Path
 
 BASE_DIR = Path(__file__).parent
-# w用（em6）
-CSV_CANDIDATES_EM = [
-    BASE_DIR.parent / "_砦攻略システム" / "pwa" / "npc_strategy_export.csv",
-    BASE_DIR / "npc_strategy_em6_rows.csv",
-    BASE_DIR / "npc_strategy_export.csv",
-]
-OUT_PATH_EM = BASE_DIR / "fort_status.json"
-# c4用（cw2）
-CSV_CANDIDATES_CW = [
-    BASE_DIR / "npc_strategy_cw2_rows.csv",
-    BASE_DIR.parent / "_砦攻略システム" / "pwa" / "npc_strategy_cw2_export.csv",
+# 既定の入力: (event_id 列が無い行の event, 候補パス…)。候補は先に見つかった1つを使う
+CSV_SOURCES = [
+    ("w1", [
+        BASE_DIR.parent / "_砦攻略システム" / "pwa" / "npc_strategy_export.csv",
+        BASE_DIR / "npc_strategy_em6_rows.csv",
+        BASE_DIR / "npc_strategy_export.csv",
+    ]),
+    ("e1", [
+        BASE_DIR / "npc_strategy_cw2_rows.csv",
+        BASE_DIR.parent / "_砦攻略システム" / "pwa" / "npc_strategy_cw2_export.csv",
+    ]),
 ]
-OUT_PATH_CW = BASE_DIR / "fort_status_c4.json"
+BUNDLE_NAME = "fort_status_bundle.json"
+# event ごとの紐付けキー。name = npc_name、coord = "x,y"（遠征の砦名「北西砦818」と砦攻略の「許昌：南西砦100」の違いを吸収）
+# 載っていない event は座標列があれば coord、無ければ name
+EVENT_KEYS = {"w1": "name", "e1": "coord"}
+_CODE_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+Columns = namedtuple("Columns", "name status x y event")
+
+
+def slice_path(event: str, base_dir: Path = BASE_DIR) -> Path:
+    return base_dir / f"fort_status.{event}.json"
 
 
 def find_csv(candidates):
@@ -32,75 +53,144 @@ def find_csv(candidates):
     return None
 
 
-def build_status_map(csv_path, use_coord_key=False):
-    """use_coord_key=True のときは c4 用：キーを "x,y" にして遠征マップの砦名違いを吸収する。"""
-    status_map = {}
-    with open(csv_path, encoding="utf-8-sig") as f:
-        r = csv.DictReader(f)
-        if not r.fieldnames:
-            return None, "CSV にヘッダーがありません"
-        name_col = "npc_name" if "npc_name" in r.fieldnames else None
-        status_col = "strategy_status" if "strategy_status" in r.fieldnames else None
-        x_col = "base1_x" if "base1_x" in r.fieldnames else None
-        y_col = "base1_y" if "base1_y" in r.fieldnames else None
-        if not name_col:
-            for c in r.fieldnames:
-                if "name" in c.lower() or c == "NPC名":
-                    name_col = c
-                    break
-        if not status_col:
-            for c in r.fieldnames:
-                if "status" in c.lower() or "攻略" in c:
-                    status_col = c
-                    break
-        if not name_col or not status_col:
-            return None, f"npc_name/strategy_status に相当する列が見つかりません: {r.fieldnames}"
-        if use_coord_key and (not x_col or not y_col):
-            return None, "c4用は base1_x, base1_y 列が必要です（座標キーで紐付け）"
+def resolve_columns(fieldnames):
+    """ヘッダーから各列の位置を1回だけ決める。見つからない列は None。"""
+    def first(exact, pred):
+        if exact in fieldnames:
+            return fieldnames.index(exact)
+        return next((i for i, c in enumerate(fieldnames) if pred(c)), None)
+
+    return Columns(
+        name=first("npc_name", lambda c: "name" in c.lower() or c == "NPC名"),
+        status=first("strategy_status", lambda c: "status" in c.lower() or "攻略" in c),
+        x=fieldnames.index("base1_x") if "base1_x" in fieldnames else None,
+        y=fieldnames.index("base1_y") if "base1_y" in fieldnames else None,
+        event=fieldnames.index("event_id") if "event_id" in fieldnames else None,
+    )
+
+
+def read_statuses(csv_path, default_event, events):
+    """CSV を1行ずつ読み、events[event][キー] = 状況 に足す。
+
+    途中でエラーになったらメッセージを返し、そのファイルの行は1つも足さない（前半だけの状況で切り出しを上書きしないため）。
+    """
+    read = {}
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        r = csv.reader(f)
+        header = next(r, None)
+        if not header:
+            return "CSV にヘッダーがありません"
+        cols = resolve_columns(header)
+        if cols.name is None or cols.status is None:
+            return f"npc_name/strategy_status に相当する列が見つかりません: {header}"
+        if cols.event is None and not default_event:
+            return "event_id 列が無いので event を指定してください（例: w1=ファイル名）"
+        has_coord = cols.x is not None and cols.y is not None
+        width = len(header)
         for row in r:
-            status = (row.get(status_col) or "").strip()
+            if len(row) < width:
+                row += [""] * (width - len(row))
+            status = row[cols.status].strip()
             if not status:
                 continue
-            if use_coord_key and x_col is not None and y_col is not None:
+            event = (row[cols.event].strip() if cols.event is not None else "") or default_event
+            if not event:
+                continue
+            key_mode = EVENT_KEYS.get(event, "coord" if has_coord else "name")
+            if key_mode == "coord":
+                if not has_coord:
+                    return f"{event} は base1_x, base1_y 列が必要です（座標キーで紐付け）"
                 try:
-                    k = f"{int(row.get(x_col, 0))},{int(row.get(y_col, 0))}"
-                    status_map[k] = status
-                except (ValueError, TypeError):
-                    pass
+                    k = f"{int(row[cols.x])},{int(row[cols.y])}"
+                except ValueError:
+                    continue
+            else:
+                k = row[cols.name].strip()
+                if not k:
+                    continue
+            read.setdefault(event, (key_mode, {}))[1][k] = status
+    for event, (key_mode, m) in read.items():
+        events.setdefault(event, (key_mode, {}))[1].update(m)
+    return None
+
+
+def encode_events(events):
+    """{event: (key, {キー: 状況})} → 語彙表付きの {"v", "events"}。"""
+    vocab = sorted({s for _, m in events.values() for s in m.values()})
+    if len(vocab) > len(_CODE_DIGITS):
+        raise ValueError(f"状況の種類が多すぎます（{len(vocab)} 種類）: {vocab}")
+    code = {s: _CODE_DIGITS[i] for i, s in enumerate(vocab)}
+    out = {}
+    for event in sorted(events):
+        key_mode, m = events[event]
+        keys = sorted(m)
+        out[event] = {"key": key_mode, "k": keys, "c": "".join(code[m[k]] for k in keys)}
+    return {"v": vocab, "events": out}
+
+
+def decode_status(obj) -> dict:
+    """切り出し・バンドル内の1 event（"v", "k", "c"）を {キー: 状況} に戻す。従来の平らな辞書はそのまま返す。"""
+    if isinstance(obj, dict) and {"v", "k", "c"} <= obj.keys():
+        return {k: obj["v"][int(c, 36)] for k, c in zip(obj["k"], obj["c"])}
+    return obj if isinstance(obj, dict) else {}
+
+
+def dump(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def parse_sources(args):
+    """コマンドライン引数 → [(event, パス)]。引数が無ければ CSV_SOURCES から見つかったもの。"""
+    if not args:
+        sources = []
+        for event, candidates in CSV_SOURCES:
+            p = find_csv(candidates)
+            if p:
+                sources.append((event, p))
             else:
-                name = (row.get(name_col) or "").strip()
-                if name:
-                    status_map[name] = status
-    return status_map, None
+                print(f"{event}用CSVが見つかりません。以下のいずれかを配置してください:")
+                for c in candidates:
+                    print("  -", c)
+        return sources
+    sources = []
+    for a in args:
+        event, sep, path = a.partition("=")
+        sources.append((event, Path(path)) if sep and not Path(a).exists() else ("", Path(a)))
+    return sources
 
 
-def main():
-    # w用
-    csv_em = find_csv(CSV_CANDIDATES_EM)
-    if csv_em:
-        status_em, err = build_status_map(csv_em)
-        if err:
-            print("w用:", err)
-        else:
-            OUT_PATH_EM.write_text(json.dumps(status_em, ensure_ascii=False, indent=0), encoding="utf-8")
-            print(f"Generated: {OUT_PATH_EM} ({len(status_em)} entries, w用 from {csv_em.name})")
-    else:
-        print("w用CSVが見つかりません。以下のいずれかを配置してください:")
-        for p in CSV_CANDIDATES_EM:
-            print("  -", p)
-    # c4用（座標キー "x,y" で出力＝遠征の砦名「北西砦818」と砦攻略の「許昌：南西砦100」の違いを吸収）
-    csv_cw = find_csv(CSV_CANDIDATES_CW)
-    if csv_cw:
-        status_cw, err = build_status_map(csv_cw, use_coord_key=True)
+def load_bundle_events(path: Path) -> dict:
+    """既存のバンドルを {event: (key, {キー: 状況})} で読む。無い・壊れている場合は空。"""
+    try:
+        bundle = json.loads(path.read_text(encoding="utf-8"))
+        return {e: (d["key"], decode_status(dict(d, v=bundle["v"]))) for e, d in bundle["events"].items()}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def main(argv=None, base_dir: Path = BASE_DIR):
+    sources = parse_sources(sys.argv[1:] if argv is None else argv)
+    events = {}
+    for default_event, path in sources:
+        err = read_statuses(path, default_event, events)
         if err:
-            print("c4用:", err)
-        else:
-            OUT_PATH_CW.write_text(json.dumps(status_cw, ensure_ascii=False, indent=0), encoding="utf-8")
-            print(f"Generated: {OUT_PATH_CW} ({len(status_cw)} entries, c4用 座標キー from {csv_cw.name})")
-    else:
-        print("c4用CSVが見つかりません（任意）。以下のいずれかを置くと fort_status_c4.json を生成:")
-        for p in CSV_CANDIDATES_CW:
-            print("  -", p)
+            print(f"{path.name}:", err)
+    if not events:
+        return
+    bundle_path = base_dir / BUNDLE_NAME
+    # 今回読めなかった event（CSV が無い・エラー）は前回のバンドルの分を残し、切り出しも書き換えない
+    fresh = set(events)
+    for event, data in load_bundle_events(bundle_path).items():
+        events.setdefault(event, data)
+    bundle = encode_events(events)
+    bundle_path.write_text(dump(bundle), encoding="utf-8")
+    print(f"Generated: {bundle_path} ({', '.join(f'{e} {len(s[1])}' + ('' if e in fresh else '（前回分）') for e, s in sorted(events.items()))})")
+    for event, data in bundle["events"].items():
+        if event not in fresh:
+            continue
+        path = slice_path(event, base_dir)
+        path.write_text(dump(dict(data, v=bundle["v"], event=event)), encoding="utf-8")
+        print(f"Generated: {path} ({len(data['k'])} entries, {data['key']}キー)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+マップの砦検索索引。
+名称は NFKC＋小文字化した文字の2-gram ごとの転置リスト、座標は (X, Y) 順に並べた砦番号列をビルド時に作る。
+1文字の入力（日本語の入力はほぼ必ずここから始まる）は該当が数千件になるので、1文字ごとに表示順に並べた番号列もビルド時に作る。
+番号は FORT_DATA の添字。ページ側（SEARCH_JS）は入力のたびに転置リストの積と二分探索だけで候補を出し、表示する件数が揃えば止める。
+FORT_DATA はチャンクごとに届くので、座標の二分探索は索引側の X 列で行い、まだ届いていない砦は候補から外す。
+"""
+import base64
+import unicodedata
+from itertools import groupby
+from operator import itemgetter
+
+
+def normalize_name(s: str) -> str:
+    """検索用の正規化（全角英数・記号を半角に、英字は小文字に）。ページ側の norm() と同じ。"""
+    return unicodedata.normalize("NFKC", s or "").lower()
+
+
+def _varint(values, delta=False) -> str:
+    """非負整数列を LEB128 で詰めて base64 にする。delta=True なら昇順列を「前との差−1」で詰める。"""
+    out = bytearray()
+    prev = -1
+    for v in values:
+        d = v - prev - 1 if delta else v
+        prev = v
+        while d >= 0x80:
+            out.append(d & 0x7F | 0x80)
+            d >>= 7
+        out.append(d)
+    return base64.b64encode(bytes(out)).decode("ascii")
+
+
+def _ranked_chars(ranked: list) -> str:
+    """(一致位置, 名前の長さ, 番号) の昇順のリストを、同じ (位置, 長さ) の組ごとに「件数, 番号列（前との差−1）」と並べて詰める。"""
+    out = []
+    for (at, length), group in groupby(ranked, key=itemgetter(0, 1)):
+        ids = [i for _, _, i in group]
+        out.append(len(ids))
+        out.extend(i - prev - 1 for prev, i in zip([-1] + ids, ids))
+    return _varint(out)
+
+
+def build_search_index(points: list, list_id: str) -> dict:
+    """list_id の砦だけを対象に {"grams": {2-gram: 番号列}, "chars": {1文字: 番号列}, "byXY": 番号列, "x0", "xs"} を返す。
+
+    chars は その文字を含む砦を表示順（最初の一致位置が前 → 名前が短い → 番号順）に並べたもの（_ranked_chars）。
+    xs は byXY の各砦の X を前との差で詰めたもの（先頭は x0 との差 = 0）。
+    """
+    ids = [i for i, p in enumerate(points) if p["l"] == list_id]
+    postings, chars = {}, {}
+    for i in ids:
+        name = normalize_name(points[i]["n"])
+        for g in {name[j:j + 2] for j in range(len(name) - 1)}:
+            postings.setdefault(g, []).append(i)
+        for c in set(name):
+            chars.setdefault(c, []).append((name.index(c), len(name), i))
+    by_xy = sorted(ids, key=lambda i: (points[i]["x"], points[i]["y"]))
+    xs = [points[i]["x"] for i in by_xy]
+    return {
+        "grams": {g: _varint(v, delta=True) for g, v in sorted(postings.items())},
+        "chars": {c: _ranked_chars(sorted(v)) for c, v in sorted(chars.items())},
+        "byXY": _varint(by_xy),
+        "x0": xs[0] if xs else 0,
+        "xs": _varint([x - prev for prev, x in zip(xs[:1] + xs, xs)]),
+    }
+
+
+# ページ側の検索。各マップページの <script> 内に埋め込む（ES5）。FORT_DATA と SEARCH を使う
+SEARCH_JS = r"""
+  var Search = (function() {
+    var postings = {}, ranked = {}, byXY = null, xs = null, normCache = [];
+    function unvarint(b64, delta) {
+      var bin = atob(b64 || ''), out = [], prev = -1, v = 0, shift = 0;
+      for (var i = 0; i < bin.length; i++) {
+        var c = bin.charCodeAt(i);
+        v += (c & 0x7f) * Math.pow(2, shift);
+        if (c & 0x80) { shift += 7; continue; }
+        prev = delta ? prev + v + 1 : v;
+        out.push(prev);
+        v = 0; shift = 0;
+      }
+      return out;
+    }
+    function norm(s) { return (s || '').normalize('NFKC').toLowerCase(); }
+    /* まだ届いていない砦は null */
+    function nameOf(i) { return !FORT_DATA[i] ? null : normCache[i] || (normCache[i] = norm(FORT_DATA[i].n)); }
+    function posting(g) {
+      if (!postings[g]) postings[g] = SEARCH.grams[g] == null ? [] : unvarint(SEARCH.grams[g], true);
+      return postings[g];
+    }
+    function intersect(a, b) {
+      var out = [], i = 0, j = 0;
+      while (i < a.length && j < b.length) {
+        if (a[i] === b[j]) { out.push(a[i]); i++; j++; }
+        else if (a[i] < b[j]) i++;
+        else j++;
+      }
+      return out;
+    }
+    /* 1文字の番号列（表示順）。「件数, 番号の差…」の組を戻す */
+    function rankedChar(c) {
+      if (!ranked[c]) {
+        var raw = unvarint(SEARCH.chars[c], false), out = [];
+        for (var r = 0; r < raw.length; ) {
+          for (var n = raw[r++], prev = -1; n > 0; n--) out.push(prev = prev + raw[r++] + 1);
+        }
+        ranked[c] = out;
+      }
+      return ranked[c];
+    }
+    /* 名称の部分一致。1文字はビルド時の表示順の列を前から見て limit 件で止める。
+       2文字以上は 2-gram の転置リストを短い順に積を取り、accept を通った候補だけ実際の名前で確かめて並べる */
+    function byName(q, accept, limit) {
+      var hits = [];
+      if (q.length === 1) {
+        var list = rankedChar(q);
+        for (var r = 0; r < list.length && hits.length < limit; r++) if (accept(list[r])) hits.push(list[r]);
+        return hits;
+      }
+      var lists = [];
+      for (var j = 0; j + 2 <= q.length; j++) lists.push(posting(q.substr(j, 2)));
+      lists.sort(function(a, b) { return a.length - b.length; });
+      var cand = lists[0];
+      for (var k = 1; k < lists.length && cand.length; k++) cand = intersect(cand, lists[k]);
+      /* 並び: 一致位置が前 → 名前が短い → 番号順。(位置, 長さ, 番号) を1つの数に詰めて数値ソート */
+      var keys = [];
+      for (var c = 0; c < cand.length; c++) {
+        var i = cand[c];
+        if (!accept(i)) continue;
+        var name = nameOf(i), at = name == null ? -1 : name.indexOf(q);
+        if (at >= 0) keys.push((Math.min(at, 63) * 64 + Math.min(name.length, 63)) * 2097152 + i);
+      }
+      var sorted = new Float64Array(keys).sort();
+      for (var h = 0; h < sorted.length && h < limit; h++) hits.push(sorted[h] % 2097152);
+      return hits;
+    }
+    /* (X, Y) 順の番号列で X が lo 以上になる最初の位置 */
+    function lowerX(lo) {
+      var a = 0, b = byXY.length;
+      while (a < b) { var m = (a + b) >> 1; if (xs[m] < lo) a = m + 1; else b = m; }
+      return a;
+    }
+    function byRadius(x, y, r) {
+      var out = [];
+      for (var k = lowerX(x - r); k < byXY.length && xs[k] <= x + r; k++) {
+        var p = FORT_DATA[byXY[k]];
+        if (!p) continue;
+        var dx = p.x - x, dy = p.y - y;
+        if (dx * dx + dy * dy <= r * r) out.push(byXY[k]);
+      }
+      return out.sort(function(a, b) {
+        var pa = FORT_DATA[a], pb = FORT_DATA[b];
+        return ((pa.x - x) * (pa.x - x) + (pa.y - y) * (pa.y - y)) - ((pb.x - x) * (pb.x - x) + (pb.y - y) * (pb.y - y)) || (a - b);
+      });
+    }
+    /* 「x,y」は座標一致（無ければ半径10以内）、「x,y 半径」は範囲内を近い順、それ以外は名称の部分一致。
+       accept(番号) を通った砦（届いていない砦は通さないこと）を先頭から最大 limit 件返す */
+    function query(text, accept, limit) {
+      var q = norm(text).trim();
+      if (!q) return [];
+      var m = q.match(/^(-?\d+)\s*[,\s]\s*(-?\d+)(?:\s+(\d+))?$/);
+      if (m) {
+        if (!byXY) {
+          var x0 = SEARCH.x0 || 0;
+          byXY = unvarint(SEARCH.byXY, false);
+          xs = unvarint(SEARCH.xs, false).map(function(d) { return x0 += d; });
+        }
+        var x = parseInt(m[1], 10), y = parseInt(m[2], 10), hits;
+        if (m[3] != null) hits = byRadius(x, y, parseInt(m[3], 10));
+        else {
+          hits = byRadius(x, y, 0);
+          if (!hits.length) hits = byRadius(x, y, 10);
+        }
+        return hits.filter(accept).slice(0, limit);
+      }
+      return byName(q, accept, limit);
+    }
+    return { query: query };
+  })();
+"""
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+公開ページ用の Service Worker（sw.js）を生成する。
+ページ類とマップの描画処理・データ（内容のハッシュ付きURL）はビルド内容のハッシュ付きキャッシュに事前格納して2回目以降はキャッシュから即表示し、
+攻略状況（fort_status*.json・砦攻略API）は stale-while-revalidate（手元の分を即返し、裏で取り直す）。
+ページを書き出すビルドの最後に write_service_worker() を呼ぶ。内容が変わらなければ sw.js は書き換えない。
+"""
+import hashlib
+import json
+from pathlib import Path
+
+SW_NAME = "sw.js"
+# 事前キャッシュするファイル（存在するものだけ）。ビルドで書き出すページとトップ
+PRECACHE_FILES = [
+    "index.html",
+    "遠征計画_座標別一覧.html",
+    "遠征計画_座標マップ.html",
+    "遠征計画_座標マップ_w1.html",
+    "遠征計画_座標マップ_c4.html",
+]
+# 事前キャッシュする静的ファイル（glob）。ページからは versioned_url() の「名前?v=内容のハッシュ」で参照される
+PRECACHE_ASSETS = ["map_app.css", "map_app.js", "map_data/*.js"]
+
+# 各ページの <script> に入れる登録処理（file:// で開いたときなどは何もしない）
+SW_REGISTER_JS = (
+    "if ('serviceWorker' in navigator && location.protocol !== 'file:') "
+    "navigator.serviceWorker.register('" + SW_NAME + "').catch(function() {});"
+)
+
+_SW_TEMPLATE = r"""/* 自動生成: service_worker.py。手で編集しない */
+var VERSION = '__VERSION__';
+var PRECACHE = 'expedition-precache-' + VERSION;
+var STATUS_CACHE = 'expedition-status';
+var PRECACHE_URLS = __PRECACHE_URLS__;
+
+self.addEventListener('install', function(e) {
+  e.waitUntil(caches.open(PRECACHE).then(function(c) { return c.addAll(PRECACHE_URLS); }).then(function() { return self.skipWaiting(); }));
+});
+
+self.addEventListener('activate', function(e) {
+  e.waitUntil(caches.keys().then(function(keys) {
+    return Promise.all(keys.filter(function(k) { return k.indexOf('expedition-precache-') === 0 && k !== PRECACHE; }).map(function(k) { return caches.delete(k); }));
+  }).then(function() { return self.clients.claim(); }));
+});
+
+/* 攻略状況: 同梱の fort_status*.json と砦攻略の /api/fort_status */
+function isStatus(url) {
+  return /\/fort_status[^\/]*\.json$/.test(url.pathname) || /\/api\/fort_status$/.test(url.pathname);
+}
+
+function staleWhileRevalidate(e) {
+  return caches.open(STATUS_CACHE).then(function(cache) {
+    return cache.match(e.request).then(function(cached) {
+      var refresh = fetch(e.request).then(function(res) {
+        if (res.ok) return cache.put(e.request, res.clone()).then(function() { return res; });
+        return res;
+      });
+      if (cached) {
+        e.waitUntil(refresh.catch(function() {}));
+        return cached;
+      }
+      return refresh;
+    });
+  });
+}
+
+self.addEventListener('fetch', function(e) {
+  if (e.request.method !== 'GET') return;
+  var url = new URL(e.request.url);
+  if (isStatus(url)) {
+    e.respondWith(staleWhileRevalidate(e));
+    return;
+  }
+  if (url.origin !== self.location.origin) return;
+  e.respondWith(caches.open(PRECACHE).then(function(cache) {
+    return cache.match(e.request).then(function(cached) { return cached || fetch(e.request); });
+  }));
+});
+"""
+
+
+def content_version(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def versioned_url(name: str, data: bytes) -> str:
+    """name（公開ディレクトリからの相対パス）を内容 data のハッシュ付きURLにする。内容が同じならURLも同じ。"""
+    return f"{name}?v={content_version(data)}"
+
+
+def write_service_worker(base_dir: Path) -> Path:
+    """base_dir の公開ファイルから sw.js を作る。キャッシュ名は事前キャッシュ対象の内容のハッシュ。"""
+    files = [name for name in PRECACHE_FILES if (base_dir / name).exists()]
+    assets = sorted({p.relative_to(base_dir).as_posix() for pattern in PRECACHE_ASSETS for p in base_dir.glob(pattern)})
+    h = hashlib.sha256()
+    for name in files + assets:
+        h.update(name.encode("utf-8") + b"\0")
+        h.update((base_dir / name).read_bytes())
+    urls = (["./"] if "index.html" in files else []) + files
+    urls += [versioned_url(name, (base_dir / name).read_bytes()) for name in assets]
+    text = (
+        _SW_TEMPLATE.replace("__VERSION__", h.hexdigest()[:16])
+        .replace("__PRECACHE_URLS__", json.dumps(urls, ensure_ascii=False))
+    )
+    path = base_dir / SW_NAME
+    if not path.exists() or path.read_text(encoding="utf-8") != text:
+        path.write_text(text, encoding="utf-8")
+    return path